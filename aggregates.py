@@ -0,0 +1,406 @@
+import functools
+import threading
+import weakref
+from typing import Callable, Dict, NamedTuple, Optional, TypeVar
+
+import numpy as np
+import pandas as pd
+
+from preprocessor import DERIVED_COLUMNS, derived_column, ensure_derived
+from tokenizer import count_tokens, load_stopwords, tokenize_messages
+
+MEDIA_MESSAGE = "<Media omitted>\n"
+GROUP_NOTIFICATION = "group_notification"
+
+MONTH_NAMES = ("January", "February", "March", "April", "May", "June", "July",
+               "August", "September", "October", "November", "December")
+WEEKDAY_NAMES = ("Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday")
+
+# Longest messages kept per user, and the percentiles of message length reported.
+LONGEST_TOP_K = 5
+LENGTH_PERCENTILES = (0.5, 0.9, 0.99)
+
+T = TypeVar("T")
+
+
+def _facet(method: Callable[["ChatCube"], T]) -> T:
+    """Compute an aggregate on first access and keep it for the cube's lifetime."""
+    name = method.__name__
+
+    @functools.wraps(method)
+    def getter(self: "ChatCube") -> T:
+        if name in self._facets:
+            return self._facets[name]
+        with self._lock_for(name):
+            if name not in self._facets:
+                self._facets[name] = method(self)
+            return self._facets[name]
+
+    return property(getter)
+
+
+class ActivityTensor(NamedTuple):
+    """Message counts by user x month x weekday x hour.
+
+    ``counts[u, m, d, h]`` counts the messages ``users[u]`` sent in month
+    ``m + 1``, on weekday ``d`` (Monday is 0) and in hour ``h``.
+    """
+    users: pd.Index
+    counts: np.ndarray
+
+    def select(self, selected_user: str) -> np.ndarray:
+        """The month x weekday x hour block of one user, or summed over all."""
+        if selected_user == "Overall":
+            return self.counts.sum(axis=0)
+        position = self.users.get_indexer([selected_user])[0]
+        if position < 0:
+            return np.zeros(self.counts.shape[1:], dtype=self.counts.dtype)
+        return self.counts[position]
+
+
+class ChatCube:
+    """Per-user aggregates of one preprocessed chat, built in grouped passes.
+
+    Every facet is grouped by ``user`` so both 'Overall' and single-user
+    questions are answered with a lookup or a sum instead of refiltering the
+    message frame. Facets are computed lazily, on first use. Each facet has
+    its own lock, so different facets can be built concurrently from threads.
+    """
+
+    def __init__(self, df: pd.DataFrame):
+        self._df_ref = weakref.ref(df)
+        self._lock = threading.RLock()
+        self._locks: Dict[str, threading.RLock] = {}
+        self._facets: Dict[str, object] = {}
+        self._tokens: Optional[pd.DataFrame] = None
+        self._activity_tensor: Optional[ActivityTensor] = None
+        self._lengths: Optional[pd.DataFrame] = None
+
+    def _lock_for(self, name: str) -> threading.RLock:
+        with self._lock:
+            return self._locks.setdefault(name, threading.RLock())
+
+    @property
+    def df(self) -> pd.DataFrame:
+        df = self._df_ref()
+        if df is None:
+            raise RuntimeError("The chat frame behind this cube no longer exists.")
+        return df
+
+    def _text_mask(self) -> pd.Series:
+        """Messages typed by people: no group notifications, no media placeholders."""
+        df = self.df
+        return (df["user"] != GROUP_NOTIFICATION) & (df["message"] != MEDIA_MESSAGE)
+
+    # ---------------------- FACETS ----------------------
+    @_facet
+    def activity(self) -> pd.DataFrame:
+        """Message counts per user, calendar day and hour."""
+        df = self.df
+        # Day and hour are computed here rather than added to the shared frame.
+        keys = [df["user"], derived_column(df, "only_date"), derived_column(df, "hour")]
+        counts = (
+            df.groupby(keys, sort=True, observed=True)
+            .size()
+            .reset_index(name="messages")
+        )
+        days = pd.to_datetime(counts["only_date"])
+        counts["year"] = days.dt.year
+        counts["month_num"] = days.dt.month
+        counts["month"] = days.dt.month_name()
+        counts["day_name"] = days.dt.day_name()
+        return counts
+
+    @property
+    def activity_tensor(self) -> ActivityTensor:
+        """The activity facet binned on integer codes in one pass (not persisted).
+
+        Weekday, month and hour charts and the heatmap are all slices of it.
+        """
+        with self._lock_for("activity_tensor"):
+            if self._activity_tensor is None:
+                self._activity_tensor = _activity_tensor(self.activity)
+            return self._activity_tensor
+
+    @property
+    def tokens(self) -> pd.DataFrame:
+        """Per-message tokenization shared by every text facet (not persisted)."""
+        with self._lock_for("tokens"):
+            if self._tokens is None:
+                self._tokens = tokenize_messages(self.df["message"], load_stopwords())
+            return self._tokens
+
+    @_facet
+    def user_totals(self) -> pd.DataFrame:
+        """Messages, words, media and links per user."""
+        df = self.df
+        tokens = self.tokens
+        by_user = df["user"]
+        totals = pd.DataFrame({
+            "messages": by_user.value_counts(sort=False),
+            "words": tokens["n_words"].groupby(by_user, observed=True).sum(),
+            "media": (df["message"] == MEDIA_MESSAGE).groupby(by_user, observed=True).sum(),
+            "links": tokens["n_urls"].groupby(by_user, observed=True).sum(),
+        }).sort_index()
+        return totals.rename_axis("user").astype("int64")
+
+    @_facet
+    def word_counts(self) -> pd.Series:
+        """Stopword-filtered lowercase word counts indexed by (user, word)."""
+        mask = self._text_mask()
+        return count_tokens(self.tokens.loc[mask, "tokens"], self.df.loc[mask, "user"], ("user", "word"))
+
+    @_facet
+    def emoji_counts(self) -> pd.Series:
+        """Emoji counts indexed by (user, emoji)."""
+        return count_tokens(self.tokens["emojis"], self.df["user"], ("user", "emoji"))
+
+    @property
+    def lengths(self) -> pd.DataFrame:
+        """Character and whitespace-separated word count of every message (not persisted)."""
+        with self._lock_for("lengths"):
+            if self._lengths is None:
+                messages = self.df["message"]
+                # Word counts come free with the tokens if a text facet already built them.
+                words = self._tokens["n_words"] if self._tokens is not None else messages.str.count(r"\S+")
+                self._lengths = pd.DataFrame({
+                    "chars": messages.str.len().astype("int32"),
+                    "words": words.astype("int32"),
+                })
+            return self._lengths
+
+    def _text_lengths(self) -> pd.DataFrame:
+        """Lengths of typed messages, with their user."""
+        mask = self._text_mask()
+        return self.lengths[mask].assign(user=self.df.loc[mask, "user"])
+
+    @_facet
+    def longest_messages(self) -> pd.DataFrame:
+        """Each user's ``LONGEST_TOP_K`` longest messages by character count, ranked from 1."""
+        lengths = self._text_lengths()
+        # A stable sort keeps the earlier of two equally long messages first.
+        top = (
+            lengths.sort_values("chars", ascending=False, kind="stable")
+            .groupby("user", observed=True, sort=False)
+            .head(LONGEST_TOP_K)
+        )
+        df = self.df
+        return _rank_longest(pd.DataFrame({
+            "user": top["user"],
+            "longest_message": df.loc[top.index, "message"],
+            "char_count": top["chars"],
+            "word_count": top["words"],
+            "date": df.loc[top.index, "date"],
+        }))
+
+    @_facet
+    def length_stats(self) -> pd.DataFrame:
+        """Message, character and word length summary per user, plus an 'Overall' row."""
+        lengths = self._text_lengths()
+        grouped = lengths.groupby("user", observed=True)
+        per_user = grouped.agg(
+            messages=("chars", "size"), mean_chars=("chars", "mean"), max_chars=("chars", "max"),
+            mean_words=("words", "mean"), max_words=("words", "max"),
+        ).join(grouped["chars"].quantile(list(LENGTH_PERCENTILES)).unstack().rename(columns=_percentile_name))
+        overall = pd.DataFrame({
+            "messages": len(lengths),
+            "mean_chars": lengths["chars"].mean(), "max_chars": lengths["chars"].max(),
+            "mean_words": lengths["words"].mean(), "max_words": lengths["words"].max(),
+            **{_percentile_name(q): lengths["chars"].quantile(q) for q in LENGTH_PERCENTILES},
+        }, index=["Overall"])
+        stats = pd.concat([per_user.set_axis(per_user.index.astype(str)), overall])
+        return stats.rename_axis("user").astype("float64")
+
+    @_facet
+    def length_histogram(self) -> pd.Series:
+        """Message counts indexed by (user, bucket).
+
+        Bucket 0 holds empty messages and bucket ``b > 0`` holds 2**(b-1) to
+        2**b - 1 characters.
+        """
+        lengths = self._text_lengths()
+        bucket = np.frexp(lengths["chars"].to_numpy())[1].astype("int8")
+        counts = lengths.groupby(["user", bucket], observed=True).size()
+        return counts.rename_axis(["user", "bucket"]).astype("int64").rename("count")
+
+    @_facet
+    def streak_runs(self) -> pd.DataFrame:
+        """Every run of consecutive active days, for all users in one pass."""
+        return _streak_runs(self.activity[["user", "only_date"]])
+
+    def computed_facets(self) -> Dict[str, object]:
+        """Snapshot of the facets computed so far, by name."""
+        with self._lock:
+            return dict(self._facets)
+
+    def preload(self, facets: Dict[str, object]) -> None:
+        """Seed facets restored from elsewhere so they are not recomputed."""
+        with self._lock:
+            self._facets.update(facets)
+
+    # ---------------------- LOOKUPS ----------------------
+    def activity_for(self, selected_user: str) -> pd.DataFrame:
+        activity = self.activity
+        if selected_user != "Overall":
+            activity = activity[activity["user"] == selected_user]
+        return activity
+
+    def runs_for(self, selected_user: str) -> pd.DataFrame:
+        """Streak runs of one user, or of days on which anyone wrote for 'Overall'."""
+        if selected_user == "Overall":
+            return _streak_runs(self.activity[["only_date"]].assign(user="Overall"))
+        runs = self.streak_runs
+        return runs[runs["user"] == selected_user]
+
+    def totals_for(self, selected_user: str) -> pd.Series:
+        totals = self.user_totals
+        if selected_user != "Overall":
+            if selected_user not in totals.index:
+                return pd.Series(0, index=totals.columns)
+            return totals.loc[selected_user]
+        return totals.sum()
+
+    def counts_for(self, facet: pd.Series, selected_user: str) -> pd.Series:
+        """Collapse a (user, key) count series to key counts for one user or all."""
+        if facet.empty:
+            return facet.droplevel(0) if facet.index.nlevels > 1 else facet
+        if selected_user != "Overall":
+            users = facet.index.get_level_values(0)
+            return facet[users == selected_user].droplevel(0)
+        return facet.groupby(level=1, observed=True).sum()
+
+
+def _activity_tensor(activity: pd.DataFrame) -> ActivityTensor:
+    codes, users = pd.factorize(activity["user"], sort=True)
+    days = pd.DatetimeIndex(pd.to_datetime(activity["only_date"]))
+    shape = (len(users), len(MONTH_NAMES), len(WEEKDAY_NAMES), 24)
+    flat = np.ravel_multi_index(
+        (codes, days.month.to_numpy() - 1, days.weekday.to_numpy(), activity["hour"].to_numpy()),
+        shape,
+    )
+    counts = np.bincount(flat, weights=activity["messages"].to_numpy(), minlength=int(np.prod(shape)))
+    return ActivityTensor(pd.Index(users, name="user"), counts.astype("int64").reshape(shape))
+
+
+def _percentile_name(q: float) -> str:
+    return f"p{q * 100:g}_chars"
+
+
+def _rank_longest(top: pd.DataFrame) -> pd.DataFrame:
+    """Order top-k rows by user and length, numbering each user's from 1."""
+    top = top.sort_values("char_count", ascending=False, kind="stable")
+    top.insert(1, "rank", top.groupby("user", observed=True).cumcount() + 1)
+    return top.sort_values(["rank", "char_count"], ascending=[True, False], kind="stable").reset_index(drop=True)
+
+
+def _streak_runs(days: pd.DataFrame) -> pd.DataFrame:
+    """Collapse (user, only_date) rows into runs of consecutive days.
+
+    A run starts wherever the user changes or the gap to the previous active
+    day is not exactly one day; runs are then aggregated in one groupby.
+    """
+    days = days.assign(only_date=pd.to_datetime(days["only_date"])).drop_duplicates()
+    days = days.sort_values(["user", "only_date"], ignore_index=True)
+    new_run = (days["user"] != days["user"].shift()) | (days["only_date"].diff() != pd.Timedelta(days=1))
+    return (
+        days.groupby(new_run.cumsum(), sort=False)
+        .agg(user=("user", "first"), start=("only_date", "first"),
+             end=("only_date", "last"), days=("only_date", "size"))
+        .reset_index(drop=True)
+    )
+
+
+_CUBES: Dict[int, ChatCube] = {}
+_CUBES_LOCK = threading.Lock()
+
+
+def cube_for(df: pd.DataFrame) -> ChatCube:
+    """Return the cube for ``df``, building it on first request.
+
+    Cubes are keyed by frame identity and dropped when the frame is garbage
+    collected, so keeping the same frame across reruns keeps its aggregates.
+    """
+    key = id(df)
+    with _CUBES_LOCK:
+        cube = _CUBES.get(key)
+        if cube is None or cube._df_ref() is not df:
+            cube = ChatCube(df)
+            _CUBES[key] = cube
+            weakref.finalize(df, _CUBES.pop, key, None)
+        return cube
+
+
+# ---------------------- INCREMENTAL ----------------------
+def _merge_counts(old: pd.Series, new: pd.Series) -> pd.Series:
+    return old.add(new, fill_value=0).astype("int64").rename(old.name)
+
+
+def _merge_totals(old: pd.DataFrame, new: pd.DataFrame) -> pd.DataFrame:
+    return old.add(new, fill_value=0).astype("int64")
+
+
+def _merge_activity(old: pd.DataFrame, new: pd.DataFrame) -> pd.DataFrame:
+    # The calendar columns depend only on the day, so any row's values will do.
+    merged = pd.concat([old, new], ignore_index=True)
+    return (
+        merged.groupby(["user", "only_date", "hour"], sort=True, observed=True)
+        .agg(
+            messages=("messages", "sum"),
+            year=("year", "first"),
+            month_num=("month_num", "first"),
+            month=("month", "first"),
+            day_name=("day_name", "first"),
+        )
+        .reset_index()
+    )
+
+
+def _merge_longest(old: pd.DataFrame, new: pd.DataFrame) -> pd.DataFrame:
+    frames = [frame for frame in (old, new) if not frame.empty]
+    if len(frames) < 2:
+        return (frames or [old])[0]
+    # The older export comes first, so it wins ties as before.
+    merged = pd.concat(frames, ignore_index=True).drop(columns="rank")
+    top = (
+        merged.sort_values("char_count", ascending=False, kind="stable")
+        .groupby("user", observed=True, sort=False)
+        .head(LONGEST_TOP_K)
+    )
+    return _rank_longest(top)
+
+
+_MERGERS: Dict[str, Callable[[object, object], object]] = {
+    "activity": _merge_activity,
+    "user_totals": _merge_totals,
+    "word_counts": _merge_counts,
+    "emoji_counts": _merge_counts,
+    "longest_messages": _merge_longest,
+    "length_histogram": _merge_counts,
+}
+
+
+def extend_chat(df: pd.DataFrame, tail: pd.DataFrame) -> pd.DataFrame:
+    """Append newly exported messages to an analysed chat.
+
+    ``tail`` holds the messages that follow ``df`` in a newer export of the
+    same chat. Facets already computed for ``df`` are merged with the
+    tail's own facets instead of being rebuilt over the whole history.
+    """
+    derived = [column for column in DERIVED_COLUMNS if column in df.columns]
+    if derived:
+        ensure_derived(tail, *derived)
+    combined = pd.concat([df, tail], ignore_index=True)
+    combined.attrs = dict(df.attrs)
+    # Categoricals with different categories concatenate to plain strings.
+    for column, dtype in df.dtypes.items():
+        if isinstance(dtype, pd.CategoricalDtype) and combined[column].dtype != dtype:
+            combined[column] = combined[column].astype(dtype if dtype.ordered else "category")
+
+    tail_cube = cube_for(tail)
+    merged = {
+        name: _MERGERS[name](facet, getattr(tail_cube, name))
+        for name, facet in cube_for(df).computed_facets().items()
+        if name in _MERGERS
+    }
+    cube_for(combined).preload(merged)
+    return combined
@@ -0,0 +1,271 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+from typing import Dict, Iterable, Optional, Tuple, Union
+
+import pandas as pd
+
+from aggregates import cube_for
+from search_index import SearchIndex
+
+CACHE_DIR_ENV = "CHAT_ANALYZER_CACHE_DIR"
+CACHE_MAX_MB_ENV = "CHAT_ANALYZER_CACHE_MAX_MB"
+
+_DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "whatsapp-chat-analyzer")
+_DEFAULT_MAX_MB = 1024
+
+# Bumped whenever the stored frame or facet layout changes; older entries are ignored.
+_FORMAT_VERSION = 4
+
+_FRAME_FILE = "frame.parquet"
+_META_FILE = "meta.json"
+
+
+def content_key(raw: Union[bytes, Iterable[bytes]]) -> str:
+    """Hash the raw upload bytes (before any decoding) into a cache key."""
+    digest = hashlib.sha256()
+    if isinstance(raw, (bytes, bytearray, memoryview)):
+        digest.update(raw)
+    else:
+        for chunk in raw:
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def text_fingerprint(text: Union[str, Iterable[str]]) -> Optional[Dict[str, object]]:
+    """Describe decoded export text so a longer, later export can be matched to it.
+
+    ``text`` may be a string or an iterable of text chunks. Only text ending
+    on a line break is fingerprinted: a newer export can only be cut there
+    without splitting the final message.
+    """
+    digest = hashlib.sha256()
+    chars = 0
+    last = ""
+    for chunk in [text] if isinstance(text, str) else text:
+        if chunk:
+            digest.update(chunk.encode("utf-8"))
+            chars += len(chunk)
+            last = chunk[-1]
+    if last != "\n":
+        return None
+    return {"chars": chars, "sha256": digest.hexdigest()}
+
+
+def longest_prefix(
+    candidates: Dict[int, Dict[str, str]], text: Union[str, Iterable[str]]
+) -> Optional[Tuple[str, int]]:
+    """Match ``text`` against fingerprinted texts.
+
+    ``candidates`` maps a fingerprint's length to its digests and their
+    keys. Returns the key whose text is the longest prefix of ``text`` and
+    that length, or None. All lengths are checked in one hashing pass,
+    which stops after the longest.
+    """
+    checkpoints = sorted(candidates)
+    digest = hashlib.sha256()
+    hashed = 0
+    found = None
+    for chunk in [text] if isinstance(text, str) else text:
+        if not checkpoints:
+            break
+        offset = 0
+        while checkpoints and checkpoints[0] <= hashed + len(chunk) - offset:
+            chars = checkpoints.pop(0)
+            digest.update(chunk[offset:offset + chars - hashed].encode("utf-8"))
+            offset += chars - hashed
+            hashed = chars
+            key = candidates[chars].get(digest.hexdigest())
+            if key is not None:
+                found = (key, chars)
+        digest.update(chunk[offset:].encode("utf-8"))
+        hashed += len(chunk) - offset
+    return found
+
+
+def _facet_to_frame(value: object) -> Tuple[pd.DataFrame, Dict[str, object]]:
+    """Flatten a facet into a Parquet-friendly frame plus how to rebuild it."""
+    spec: Dict[str, object] = {"series": isinstance(value, pd.Series), "index": []}
+    frame = value.to_frame("count") if isinstance(value, pd.Series) else value
+    if any(name is not None for name in frame.index.names):
+        spec["index"] = list(frame.index.names)
+        frame = frame.reset_index()
+    return frame, spec
+
+
+def _frame_to_facet(frame: pd.DataFrame, spec: Dict[str, object]) -> object:
+    if spec["index"]:
+        frame = frame.set_index(spec["index"])
+    return frame["count"] if spec["series"] else frame
+
+
+class AnalysisCache:
+    """Size-bounded on-disk store of preprocessed chats and their aggregates.
+
+    Each entry is a directory named by the content key holding the message
+    frame and every computed cube facet as Parquet, a small JSON manifest
+    and, once a search was run, the message search index. Entries are published with an atomic rename, so several app
+    replicas can share one directory. When the total size exceeds
+    ``max_bytes`` the least recently used entries are removed.
+    """
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    @classmethod
+    def from_env(cls) -> "AnalysisCache":
+        directory = os.environ.get(CACHE_DIR_ENV, _DEFAULT_CACHE_DIR)
+        max_mb = float(os.environ.get(CACHE_MAX_MB_ENV, _DEFAULT_MAX_MB))
+        return cls(directory, int(max_mb * 1024 * 1024))
+
+    def _entry(self, key: str) -> str:
+        return os.path.join(self.directory, key)
+
+    def load(self, key: str) -> Optional[Tuple[pd.DataFrame, Dict[str, object]]]:
+        """Return the cached frame (with its cube preloaded) and manifest, or None."""
+        entry = self._entry(key)
+        meta_path = os.path.join(entry, _META_FILE)
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            if meta.get("version") != _FORMAT_VERSION:
+                return None
+            df = pd.read_parquet(os.path.join(entry, _FRAME_FILE))
+            facets = {
+                name: _frame_to_facet(pd.read_parquet(os.path.join(entry, f"{name}.parquet")), spec)
+                for name, spec in meta["facets"].items()
+            }
+        except (OSError, ValueError, KeyError):
+            return None
+
+        df.attrs.update(meta.get("attrs", {}))
+        cube_for(df).preload(facets)
+        os.utime(meta_path)  # mark as recently used
+        return df, meta
+
+    def find_prefix(self, text: Union[str, Iterable[str]]) -> Optional[Tuple[str, int]]:
+        """Find the cached export whose text is the longest prefix of ``text``.
+
+        ``text`` may be a string or an iterable of text chunks. Returns the
+        entry key and the length of the shared prefix, or None.
+        """
+        candidates: Dict[int, Dict[str, str]] = {}
+        for name in os.listdir(self.directory):
+            if name.startswith("."):
+                continue
+            try:
+                with open(os.path.join(self._entry(name), _META_FILE), "r", encoding="utf-8") as f:
+                    meta = json.load(f)
+            except (OSError, ValueError):
+                continue
+            fingerprint = meta.get("text")
+            if fingerprint and meta.get("version") == _FORMAT_VERSION:
+                candidates.setdefault(fingerprint["chars"], {})[fingerprint["sha256"]] = name
+
+        return longest_prefix(candidates, text)
+
+    def store(self, key: str, df: pd.DataFrame, **extra: object) -> None:
+        """Persist ``df`` and its computed cube facets under ``key``.
+
+        ``extra`` values (e.g. the source file label) are kept in the manifest.
+        """
+        entry = self._entry(key)
+        if os.path.isdir(entry):
+            return
+
+        staging = tempfile.mkdtemp(prefix=f".{key}.", dir=self.directory)
+        try:
+            df.to_parquet(os.path.join(staging, _FRAME_FILE), index=False)
+            specs = {}
+            for name, value in cube_for(df).computed_facets().items():
+                frame, specs[name] = _facet_to_frame(value)
+                frame.to_parquet(os.path.join(staging, f"{name}.parquet"), index=False)
+            meta = dict(extra, version=_FORMAT_VERSION, attrs=dict(df.attrs), facets=specs)
+            with open(os.path.join(staging, _META_FILE), "w", encoding="utf-8") as f:
+                json.dump(meta, f)
+            os.rename(staging, entry)
+        except OSError:
+            # Another process published the same entry first, or the disk is full.
+            shutil.rmtree(staging, ignore_errors=True)
+            return
+
+        self._evict()
+
+    def add_facets(self, key: str, df: pd.DataFrame) -> None:
+        """Persist facets of ``df`` computed since ``key`` was stored.
+
+        Facets are computed lazily, so an entry grows as sections are opened.
+        Each new facet file is in place before the manifest lists it.
+        """
+        entry = self._entry(key)
+        meta_path = os.path.join(entry, _META_FILE)
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return
+        missing = {
+            name: value for name, value in cube_for(df).computed_facets().items()
+            if name not in meta["facets"]
+        }
+        if not missing:
+            return
+
+        try:
+            for name, value in missing.items():
+                frame, meta["facets"][name] = _facet_to_frame(value)
+                staging = os.path.join(entry, f".{name}.parquet")
+                frame.to_parquet(staging, index=False)
+                os.replace(staging, os.path.join(entry, f"{name}.parquet"))
+            staging = os.path.join(entry, f".{_META_FILE}")
+            with open(staging, "w", encoding="utf-8") as f:
+                json.dump(meta, f)
+            os.replace(staging, meta_path)
+        except OSError:
+            return
+        self._evict()
+
+    def load_search_index(self, key: str) -> Optional[SearchIndex]:
+        """Return the message search index stored with ``key``, or None."""
+        return SearchIndex.load(self._entry(key))
+
+    def store_search_index(self, key: str, index: SearchIndex) -> None:
+        """Save a search index next to the frame stored under ``key``."""
+        entry = self._entry(key)
+        if not os.path.isdir(entry):
+            return
+        try:
+            index.save(entry)
+        except OSError:
+            return
+        self._evict()
+
+    def _evict(self) -> None:
+        """Drop least recently used entries until the cache fits ``max_bytes``."""
+        with self._lock:
+            entries = []
+            for name in os.listdir(self.directory):
+                path = self._entry(name)
+                if name.startswith(".") or not os.path.isdir(path):
+                    continue
+                try:
+                    used = os.path.getmtime(os.path.join(path, _META_FILE))
+                    size = sum(
+                        os.path.getsize(os.path.join(path, file)) for file in os.listdir(path)
+                    )
+                except OSError:
+                    continue
+                entries.append((used, size, path))
+
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                shutil.rmtree(path, ignore_errors=True)
+                total -= size
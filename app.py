@@ -1,69 +1,375 @@
-import io
-import zipfile
+import datetime
+import functools
+import itertools
+import json
 from typing import Tuple
 
-import matplotlib.pyplot as plt
-import plotly.express as px
+import pandas as pd
 import streamlit as st
-import hashlib
 
+import aggregates
 import backhand
+import charts
+import diagnostics
+import ingest
 import preprocessor
+from analysis_cache import AnalysisCache, content_key, text_fingerprint
+from corpus import CorpusStore
+from search_index import SearchIndex
+from section_runner import SectionRunner
+from wordcloud_cache import WordcloudCache
+
+
+# Parsed frames (with their aggregates) and search indexes kept per process.
+MAX_CHATS_IN_MEMORY = 4
+
+
+@st.cache_resource
+def get_analysis_cache() -> AnalysisCache:
+    return AnalysisCache.from_env()
+
+
+# Cache the preprocessed dataframe by a hash of the raw upload bytes.
+# cache_resource hands back the same frame on every rerun, so the per-user
+# aggregates built on it survive switching the selected user; the on-disk
+# cache lets restarts and other replicas skip decoding and parsing entirely,
+# and lets a re-export of a known chat reuse the analysis of its older part.
+# Aggregates are not built here: each dashboard section builds what it needs
+# when it is opened, and the results are added to the disk entry as they appear.
+# Only the most recent chats stay in memory; older ones reload from disk.
+@st.cache_resource(show_spinner=False, max_entries=MAX_CHATS_IN_MEMORY)
+def get_preprocessed_df(file_hash: str, _uploaded_file) -> Tuple[pd.DataFrame, str, diagnostics.ParseReport]:
+    with diagnostics.capture() as report:
+        df, source_name = _load_or_parse(file_hash, _uploaded_file)
+    # Lets per-chat caches (e.g. rendered word clouds) key on the upload.
+    df.attrs["content_key"] = file_hash
+    return df, source_name, report
+
+
+def _load_or_parse(file_hash: str, uploaded_file) -> Tuple[pd.DataFrame, str]:
+    cache = get_analysis_cache()
+    with diagnostics.stage("cache_load"):
+        cached = cache.load(file_hash)
+    if cached is not None:
+        df, meta = cached
+        return df, meta.get("source_name", uploaded_file.name)
+
+    name = uploaded_file.name
+    source_name = ingest.chat_label(uploaded_file, name)
+    df = None
+    # A newer export of a chat seen before only needs its new tail parsed.
+    with diagnostics.stage("cache_prefix"):
+        base = cache.find_prefix(ingest.iter_chat_text(uploaded_file, name))
+    if base is not None:
+        tail = ingest.iter_chat_text(uploaded_file, name, start=base[1])
+        head = next(tail, "")
+        cached = cache.load(base[0]) if preprocessor.starts_new_message(head) else None
+        if cached is not None:
+            base_df = cached[0]
+            try:
+                tail_df = preprocessor.preprocess_stream(
+                    itertools.chain([head], tail), date_format=base_df.attrs.get("date_format")
+                )
+            except ValueError:
+                # The tail disagrees with the cached date order: parse the export whole.
+                tail_df = None
+            if tail_df is not None:
+                with diagnostics.stage("extend", messages=len(tail_df)):
+                    df = aggregates.extend_chat(base_df, preprocessor.compact_schema(tail_df))
+    if df is None:
+        df = preprocessor.preprocess_stream(ingest.iter_chat_text(uploaded_file, name))
+        df = preprocessor.compact_schema(df)
+    with diagnostics.stage("cache_store"):
+        fingerprint = text_fingerprint(ingest.iter_chat_text(uploaded_file, name))
+        cache.store(file_hash, df, source_name=source_name, text=fingerprint)
+    return df, source_name
+
+# Built on the first search of a chat and saved with its cache entry, so later
+# uploads of the same export load it instead of re-indexing.
+@st.cache_resource(show_spinner=False, max_entries=MAX_CHATS_IN_MEMORY)
+def get_search_index(file_hash: str, _df: pd.DataFrame) -> SearchIndex:
+    cache = get_analysis_cache()
+    index = cache.load_search_index(file_hash)
+    if index is None or len(index) != len(_df):
+        index = SearchIndex.build(_df)
+        cache.store_search_index(file_hash, index)
+    return index
+
+
+@st.cache_resource
+def get_corpus_store() -> CorpusStore:
+    return CorpusStore.from_env()
+
+
+@st.cache_resource
+def get_wordcloud_cache() -> WordcloudCache:
+    return WordcloudCache.from_env()
+
+
+def wordcloud_png(cache: WordcloudCache, user: str, df: pd.DataFrame) -> bytes:
+    return cache.png(df.attrs["content_key"], user, lambda: backhand.word_frequencies(user, df))
+
+
+@st.cache_resource
+def get_section_runner() -> SectionRunner:
+    return SectionRunner.from_env()
+
+
+# ------------------------ LAZY SECTIONS ------------------------
+# Each section's data is computed only once its toggle is switched on. All
+# selected sections run together on the shared SectionRunner pool, which
+# keeps results per (chat, user, section) so reruns and revisits are lookups.
+SECTION_DATA = {
+    "Top Statistics": backhand.user_stats,
+    "Most Busy Person": lambda user, df: backhand.most_busy_person(df),
+    # The second chart is bounded in points however long the chat runs.
+    "Timelines": lambda user, df: (backhand.monthly_timeline(user, df), backhand.timeline(user, df)),
+    "Activity Map": lambda user, df: (backhand.week_activity_map(user, df), backhand.month_activity_map(user, df)),
+    "Weekly Activity Heatmap": backhand.activity_heatmap,
+    "Active Hours & Chat Streak": lambda user, df: (backhand.active_hours(user, df), backhand.streak_summary(user, df)),
+    "Top Streaks": lambda user, df: backhand.top_streaks(df),
+    "Longest Paragraph by User": lambda user, df: backhand.longest_paragraph_by_user(df),
+    "Message Lengths": lambda user, df: (
+        backhand.length_stats(user, df), backhand.length_histogram(user, df), backhand.longest_messages(user, df)
+    ),
+    # Rendered to PNG in the worker and cached by chat and user; only the bytes come back.
+    # The cache is resolved here, on the script thread: pool threads have no Streamlit context.
+    "Wordcloud": functools.partial(wordcloud_png, get_wordcloud_cache()),
+    "Most Common Words": backhand.most_common_words,
+    "Emoji Analysis": backhand.emoji_helper,
+}
+
+# Group-level sections, shown for 'Overall' only.
+OVERALL_SECTIONS = (
+    "Most Busy Person", "Timelines", "Activity Map",
+    "Active Hours & Chat Streak", "Top Streaks", "Longest Paragraph by User",
+)
 
 
-def _decode_chat_bytes(chat_bytes: bytes) -> str:
-    """Decode WhatsApp chat bytes, trying common encodings."""
-    tried_encodings = ["utf-8", "utf-16", "utf-16-le", "utf-16-be", "iso-8859-1"]
-    for encoding in tried_encodings:
-        try:
-            return chat_bytes.decode(encoding)
-        except UnicodeDecodeError:
-            continue
-    return chat_bytes.decode("utf-8", errors="replace")
+def show_top_statistics(data):
+    num_messages, words, num_media_messages, num_links = data
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        st.metric("Total Messages", num_messages)
 
+    with col2:
+        st.metric("Total Words", words)
 
-ZIP_SIGNATURES = (b"PK\x03\x04", b"PK\x05\x06", b"PK\x07\x08")
+    with col3:
+        st.metric("Media Shared", num_media_messages)
 
+    with col4:
+        st.metric("Links Shared", num_links)
+
+
+def show_most_busy_person(data):
+    top_users, new_df = data
+    col1, col2 = st.columns(2)
+    with col1:
+        st.plotly_chart(charts.most_busy_person(top_users), use_container_width=True)
+    with col2:
+        st.dataframe(new_df)
+
+
+def show_timelines(data):
+    timeline, over_time = data
+    st.plotly_chart(charts.monthly_timeline(timeline), use_container_width=True)
+    st.plotly_chart(charts.timeline(over_time), use_container_width=True)
+    shown = over_time.points["user"].value_counts().max() if len(over_time.points) else 0
+    if shown < over_time.buckets:
+        st.caption(f"Showing {shown} of {over_time.buckets} {over_time.resolution}s, keeping peaks and dips.")
+
+
+def show_activity_map(data):
+    busy_day, busy_month = data
+    col1, col2 = st.columns(2)
+
+    # ---------- BUSIEST DAY ----------
+    with col1:
+        st.header("Most Busy Day")
+        st.plotly_chart(charts.week_activity_map(busy_day), use_container_width=True)
+
+    # ---------- BUSIEST MONTH ----------
+    with col2:
+        st.header("Most Busy Month")
+        st.plotly_chart(charts.month_activity_map(busy_month), use_container_width=True)
+
+
+def show_activity_heatmap(matrix):
+    st.plotly_chart(charts.activity_heatmap(matrix), use_container_width=True)
+
+
+def show_active_hours_and_streak(data):
+    active_hours, streak = data
+    colA, colB = st.columns([2, 1], gap="large")
+
+    with colA:
+        st.plotly_chart(charts.active_hours(active_hours), use_container_width=True)
+
+    with colB:
+        st.metric("🔥 Longest Streak", f"{streak['longest']} Days")
+        if streak["longest"]:
+            st.caption(f"{streak['start']:%Y-%m-%d} → {streak['end']:%Y-%m-%d}")
+        st.metric("⚡ Current Streak", f"{streak['current']} Days")
+        if streak["current"]:
+            st.caption(f"Since {streak['current_start']:%Y-%m-%d}")
+
+
+def show_top_streaks(table):
+    if table.empty:
+        st.info("No messages found to analyze.")
+        return
+    st.dataframe(
+        table.rename(columns={
+            "user": "User", "longest": "Longest (days)", "start": "From", "end": "To",
+            "current": "Current (days)", "current_start": "Current since",
+        }),
+        hide_index=True,
+    )
+
+
+# Long messages are shown a page at a time so a huge paragraph never ships whole.
+MESSAGE_PAGE_CHARS = 2000
+
+
+def show_message_text(text, key):
+    pages = max(1, -(-len(text) // MESSAGE_PAGE_CHARS))
+    page = 1
+    if pages > 1:
+        page = st.number_input(f"Page (of {pages})", min_value=1, max_value=pages, value=1, key=f"{key}_page")
+    start = (page - 1) * MESSAGE_PAGE_CHARS
+    st.text_area(
+        "Message content",
+        value=text[start:start + MESSAGE_PAGE_CHARS],
+        height=150,
+        disabled=True,
+        key=key
+    )
+    if pages > 1:
+        st.caption(f"Characters {start + 1:,}–{min(start + MESSAGE_PAGE_CHARS, len(text)):,} of {len(text):,}")
+
+
+def show_longest_paragraphs(longest_paragraphs):
+    if longest_paragraphs.empty:
+        st.info("No messages found to analyze.")
+        return
+
+    # Display in expandable sections for each user
+    for idx, row in longest_paragraphs.iterrows():
+        with st.expander(f"👤 {row['user']} - {row['char_count']} characters, {row['word_count']} words", expanded=False):
+            col1, col2 = st.columns([3, 1])
+            with col1:
+                st.write("**Longest Message:**")
+                show_message_text(row['longest_message'], key=f"msg_{row['user']}")
+            with col2:
+                st.metric("Characters", f"{row['char_count']:,}")
+                st.metric("Words", f"{row['word_count']:,}")
+                st.caption(f"Date: {row['date'].strftime('%Y-%m-%d %H:%M')}")
 
-def _extract_txt_from_zip(file_bytes: bytes) -> Tuple[bytes, str]:
-    """Extract the largest .txt file from a WhatsApp export zip."""
-    try:
-        with zipfile.ZipFile(io.BytesIO(file_bytes)) as zipped:
-            txt_members = [
-                info for info in zipped.infolist()
-                if not info.is_dir() and info.filename.lower().endswith(".txt")
-            ]
-            if not txt_members:
-                raise ValueError("Zip archive does not contain a WhatsApp .txt export.")
-            txt_members.sort(key=lambda info: info.file_size, reverse=True)
-            chosen = txt_members[0]
-            with zipped.open(chosen) as chat_file:
-                return chat_file.read(), chosen.filename
-    except zipfile.BadZipFile as exc:
-        raise ValueError("Uploaded file is not a valid zip archive.") from exc
 
+def show_message_lengths(data):
+    stats, histogram, longest = data
+    cols = st.columns(4)
+    cols[0].metric("Median Length", f"{stats['p50_chars']:,.0f} chars")
+    cols[1].metric("90th Percentile", f"{stats['p90_chars']:,.0f} chars")
+    cols[2].metric("99th Percentile", f"{stats['p99_chars']:,.0f} chars")
+    cols[3].metric("Average Words", f"{stats['mean_words']:,.1f}")
+    st.plotly_chart(charts.length_histogram(histogram), use_container_width=True)
 
-def _looks_like_zip(file_bytes: bytes) -> bool:
-    """Check the magic number to infer zip archives even without .zip extension."""
-    return len(file_bytes) >= 4 and file_bytes[:4] in ZIP_SIGNATURES
+    for rank, row in longest.iterrows():
+        with st.expander(f"#{rank + 1} {row['user']} - {row['char_count']:,} characters, {row['date']:%Y-%m-%d}"):
+            show_message_text(row['longest_message'], key=f"lengths_{rank}")
 
 
-def load_chat_text(uploaded_file) -> Tuple[str, str]:
-    """Accept .txt or .zip uploads and return decoded chat text + file label."""
-    file_name = (uploaded_file.name or "").lower()
-    file_bytes = uploaded_file.getvalue()
+def show_wordcloud(png):
+    st.image(png)
 
-    if not file_bytes:
-        raise ValueError("Uploaded file is empty.")
 
-    extracted_label = uploaded_file.name or "uploaded file"
+def show_most_common_words(most_common_df):
+    st.plotly_chart(charts.most_common_words(most_common_df), use_container_width=True)
 
-    if file_name.endswith(".zip") or _looks_like_zip(file_bytes):
-        chat_bytes, extracted_label = _extract_txt_from_zip(file_bytes)
-    else:
-        chat_bytes = file_bytes
 
-    return _decode_chat_bytes(chat_bytes), extracted_label
+def show_emojis(emoji_df):
+    st.plotly_chart(charts.emoji_pie(emoji_df))
+
+
+SECTION_VIEWS = {
+    "Top Statistics": show_top_statistics,
+    "Most Busy Person": show_most_busy_person,
+    "Timelines": show_timelines,
+    "Activity Map": show_activity_map,
+    "Weekly Activity Heatmap": show_activity_heatmap,
+    "Active Hours & Chat Streak": show_active_hours_and_streak,
+    "Top Streaks": show_top_streaks,
+    "Longest Paragraph by User": show_longest_paragraphs,
+    "Message Lengths": show_message_lengths,
+    "Wordcloud": show_wordcloud,
+    "Most Common Words": show_most_common_words,
+    "Emoji Analysis": show_emojis,
+}
+
+
+def show_report(report, key):
+    st.dataframe(report.to_frame(), hide_index=True)
+    st.download_button(
+        "Download report (JSON)", json.dumps(report.to_dict(), indent=2, default=str),
+        file_name="parse_report.json", mime="application/json", key=key,
+    )
+
+
+def show_parser_diagnostics(report, file_hash, uploaded_file):
+    with st.expander("Parser diagnostics", expanded=True):
+        # The frame is cached per upload, so these are the stages of its first load.
+        st.caption(f"Loaded in {report.seconds:.2f} s.")
+        show_report(report, key="download_parse_report")
+
+        profile_key = ("parse_profile", file_hash)
+        if st.button("Profile a fresh parse (cProfile + tracemalloc)"):
+            with st.spinner("Profiling…"):
+                *_, st.session_state[profile_key] = ingest.diagnose_chat_file(
+                    uploaded_file, uploaded_file.name, profile=True, trace_memory=True
+                )
+        profiled = st.session_state.get(profile_key)
+        if profiled is not None:
+            st.caption(f"Profiled parse: {profiled.seconds:.2f} s (tracing slows it down several times).")
+            show_report(profiled, key="download_profile_report")
+            st.code(profiled.profile, language=None)
+            st.code(profiled.allocations, language=None)
+
+
+SEARCH_PREVIEW_CHARS = 300
+
+
+def show_search(query, file_hash, df, selected_user):
+    with st.expander("Search results", expanded=True):
+        first, last = df["date"].min().date(), df["date"].max().date()
+        days = st.date_input("Between", (first, last), min_value=first, max_value=last)
+        start, end = days if len(days) == 2 else (days[0], days[0])
+        with st.spinner("Indexing messages…"):
+            index = get_search_index(file_hash, df)
+        users = None if selected_user == "Overall" else [selected_user]
+        results = index.search(df, query, users=users, start=start, end=end)
+        st.caption(f"{results.total} matching messages" + (", newest 100 shown" if results.total > 100 else ""))
+        hits = results.messages.assign(message=results.messages["message"].str.slice(0, SEARCH_PREVIEW_CHARS))
+        st.dataframe(hits, hide_index=True, use_container_width=True)
+
+
+def show_corpus(corpus, selected_user):
+    chats = corpus.chats()
+    with st.expander("Across saved chats", expanded=True):
+        if chats.empty:
+            st.caption("No chats saved yet.")
+            return
+        st.dataframe(chats[["name", "messages", "first_message", "last_message"]], hide_index=True)
+        # Scoped to the selected person in every chat they appear in.
+        scope = {} if selected_user == "Overall" else {"users": [selected_user]}
+        # Keyed: with one saved chat these figures equal the dashboard's own.
+        st.plotly_chart(charts.active_hours(corpus.activity("hour", **scope)),
+                        use_container_width=True, key="corpus_hours")
+        busy_day = corpus.activity("weekday", **scope).sort_values(ascending=False)
+        st.plotly_chart(charts.week_activity_map(busy_day), use_container_width=True, key="corpus_weekday")
+        st.plotly_chart(charts.most_common_words(corpus.most_common_words(**scope)),
+                        use_container_width=True, key="corpus_words")
 
 
 st.sidebar.title('WhatsApp Chat Analyzer')
@@ -74,29 +380,20 @@ uploaded_file = st.sidebar.file_uploader(
     help="Direct .txt exports or the zipped export WhatsApp emails to you are both supported."
 )
 if uploaded_file is not None:
-    with st.spinner("Processing chat…"):
-        try:
-            data, source_name = load_chat_text(uploaded_file)
-        except ValueError as err:
-            st.error(f"File processing error: {err}")
-            st.stop()
+    file_hash = content_key(ingest.iter_file_bytes(uploaded_file))
 
-    st.caption(f"Analyzing: {source_name}")
-    
-    # Cache preprocessed dataframe based on file content hash
-    file_hash = hashlib.md5(data.encode()).hexdigest()
-    
-    @st.cache_data
-    def get_preprocessed_df(chat_data: str, _hash: str):
-        return preprocessor.preprocess(chat_data)
-    
     try:
-        with st.spinner("Preprocessing chat data…"):
-            df = get_preprocessed_df(data, file_hash)
+        with st.spinner("Processing chat…"):
+            df, source_name, parse_report = get_preprocessed_df(file_hash, uploaded_file)
     except ValueError as err:
-        st.error(f"Parsing error: {err}")
+        st.error(f"Processing error: {err}")
         st.stop()
 
+    st.caption(f"Analyzing: {source_name}")
+
+    if st.sidebar.checkbox("Parser diagnostics"):
+        show_parser_diagnostics(parse_report, file_hash, uploaded_file)
+
 # fetch unique users
     user_list = df['user'].unique().tolist()
 
@@ -109,226 +406,56 @@ if uploaded_file is not None:
 
     selected_user = st.sidebar.selectbox('Show Analysis wrt', user_list)
 
-
+    query = st.sidebar.text_input("Search messages", help='Words, "exact phrases" and prefix* queries.')
+    if query.strip():
+        show_search(query, file_hash, df, selected_user)
+
+    corpus = get_corpus_store()
+    if st.sidebar.button("Save chat to corpus"):
+        # A newer export of a saved chat replaces it instead of adding its history again.
+        chat_id = corpus.find_chat(ingest.iter_chat_text(uploaded_file, uploaded_file.name)) or file_hash
+        fingerprint = text_fingerprint(ingest.iter_chat_text(uploaded_file, uploaded_file.name))
+        corpus.add_chat(chat_id, df, name=source_name, fingerprint=fingerprint)
+        st.sidebar.success(f"Saved {source_name}.")
+    if st.sidebar.checkbox("Compare across saved chats"):
+        show_corpus(corpus, selected_user)
+
+    # Remember the click so opening a section (a rerun) keeps the analysis on screen.
     if st.sidebar.button('Show Analysis'):
-        with st.spinner("Calculating statistics…"):
-            num_messages, words, num_media_messages, num_links = backhand.user_stats(selected_user, df)
-        st.title("Top Statistics")
-
-        col1, col2, col3, col4 = st.columns(4)
-        with col1:
-            st.metric("Total Messages", num_messages)
-
-        with col2:
-            st.metric("Total Words", words)
-
-        with col3:
-            st.metric("Media Shared", num_media_messages)
-
-        with col4:
-            st.metric("Links Shared", num_links)
-# busy person in the group 
-        if selected_user == 'Overall':
-            st.title('Most Busy Person')
-            col1,col2 = st.columns(2)
-
-            with st.spinner("Analyzing user activity…"):
-                fig,new_df = backhand.most_busy_person(df)
-            
-            with col1 :
-                st.plotly_chart(fig, use_container_width=True)
-
-            with col2 :
-                st.dataframe(new_df)
-           # monthly timeline
-            st.title("Monthly Timeline")
-            with st.spinner("Generating timeline…"):
-                timeline = backhand.monthly_timeline(selected_user,df)
-            fig = px.area(
-            timeline,
-            x='time',
-            y='message',
-            title='Monthly Timeline',
-              )
-
-            fig.update_layout(
-            template="plotly_dark",
-            title_x=0.5,
-            xaxis_title="Time",
-            yaxis_title="Messages Count"
-            )
-
-            st.plotly_chart(fig, use_container_width=True)
-            # ------------------------ DAILY TIMELINE ------------------------
-            st.title("Daily Timeline")
-
-            with st.spinner("Generating daily timeline…"):
-                daily_timeline = backhand.daily_timeline(selected_user, df)
-
-            fig = px.area(
-                daily_timeline,
-                x="only_date",
-                y="message",
-                title="Daily Timeline",
-            )
-            fig.update_layout(title_x=0.5)
-
-            st.plotly_chart(fig, use_container_width=True)
-
-
-            # ------------------------ ACTIVITY MAP ------------------------
-            st.title("Activity Map")
-            col1, col2 = st.columns(2)
-
-            # ---------- BUSIEST DAY ----------
-            with col1:
-                st.header("Most Busy Day")
-
-                with st.spinner("Analyzing weekly activity…"):
-                    busy_day = backhand.week_activity_map(selected_user, df)
-                busy_day = busy_day.reset_index()
-                busy_day.columns = ["day", "messages"]
-
-                fig = px.bar(
-                    busy_day,
-                    x="day",
-                    y="messages",
-                    title="Most Busy Day",
-                    text="messages"
-                )
-                fig.update_traces(textposition="outside")
-                fig.update_layout(title_x=0.5)
-
-                st.plotly_chart(fig, use_container_width=True)
-
-
-            # ---------- BUSIEST MONTH ----------
-            with col2:
-                st.header("Most Busy Month")
-
-                with st.spinner("Analyzing monthly activity…"):
-                    busy_month = backhand.month_activity_map(selected_user, df)
-                busy_month = busy_month.reset_index()
-                busy_month.columns = ["month", "messages"]
-
-                fig = px.bar(
-                    busy_month,
-                    x="month",
-                    y="messages",
-                    title="Most Busy Month",
-                    text="messages"
-                )
-                fig.update_traces(textposition="outside")
-                fig.update_layout(title_x=0.5)
-
-                st.plotly_chart(fig, use_container_width=True)
-
-            # Create two side-by-side columns for both sections
-            colA, colB = st.columns([2, 1], gap="large")
-
-            with colA:
-     
-                st.title("Most Active Hours")
-
-                with st.spinner("Analyzing active hours…"):
-                    active_hours = backhand.active_hours(selected_user, df)
-
-                # Convert 24-hour → 12-hour format
-                def hour_to_12h(hour):
-                    if hour == 0:
-                        return "12 AM"
-                    elif hour < 12:
-                        return f"{hour} AM"
-                    elif hour == 12:
-                        return "12 PM"
-                    else:
-                        return f"{hour - 12} PM"
-                
-                active_hours.index = active_hours.index.map(hour_to_12h)
-
-                fig = px.bar(
-                    x=active_hours.index,
-                    y=active_hours.values,
-                    title="Active Hours (12-Hour Format)",
-                    labels={"x": "Hour", "y": "Number of Messages"},
-                    template="plotly_dark"
-                )
-
-                fig.update_layout(
-                    title_x=0.5,
-                    xaxis_tickangle=45
-                )
-
-                st.plotly_chart(fig, use_container_width=True)
-
-            # ========================
-            # RIGHT SIDE — Chat Streak
-            # ========================
-            with colB:
-                st.title("Chat Streak Analysis")
-
-                with st.spinner("Calculating streaks…"):
-                    longest, current = backhand.chat_streak(selected_user, df)
-
-                st.metric("🔥 Longest Streak", f"{longest} Days")
-                st.metric("⚡ Current Streak", f"{current} Days")
-
-            # longest paragraph
-            st.title("Longest Paragraph by User")
-            
-            with st.spinner("Finding longest paragraphs…"):
-                longest_paragraphs = backhand.longest_paragraph_by_user(df)
-            
-            if not longest_paragraphs.empty:
-                # Display in expandable sections for each user
-                for idx, row in longest_paragraphs.iterrows():
-                    with st.expander(f"👤 {row['user']} - {row['char_count']} characters, {row['word_count']} words", expanded=False):
-                        col1, col2 = st.columns([3, 1])
-                        with col1:
-                            st.write("**Longest Message:**")
-                            st.text_area(
-                                "Message content",
-                                value=row['longest_message'],
-                                height=150,
-                                disabled=True,
-                                key=f"msg_{row['user']}"
-                            )
-                        with col2:
-                            st.metric("Characters", f"{row['char_count']:,}")
-                            st.metric("Words", f"{row['word_count']:,}")
-                            st.caption(f"Date: {row['date'].strftime('%Y-%m-%d %H:%M')}")
-            else:
-                st.info("No messages found to analyze.")
-        
-        # WordCloud - visible for all users (Overall and individual)
-        st.title("Wordcloud")
-        with st.spinner("Generating wordcloud…"):
-            df_wc = backhand.wordcloud(selected_user, df)
-        fig, ax = plt.subplots()
-        ax.imshow(df_wc)
-        ax.axis('off')  # Remove axes for cleaner look
-        st.pyplot(fig)
-        
-        # most common words
-        with st.spinner("Analyzing common words…"):
-            most_common_df, fig = backhand.most_common_words(selected_user, df)
-
-        st.title("Most Common Words")
-        st.plotly_chart(fig, use_container_width=True)
-
-        with st.spinner("Analyzing emojis…"):
-            emoji_df = backhand.emoji_helper(selected_user,df)
-
-        st.title("Emoji Analysis")
-
-        fig = px.pie(
-            emoji_df.head(10),
-            names='emoji',
-            values='count',
-            title="Top Emojis"
-        )
-
-        st.plotly_chart(fig)
-
-        # Longest Paragraph by User
-
+        st.session_state["analysis_for"] = (file_hash, selected_user)
+
+    if st.session_state.get("analysis_for") == (file_hash, selected_user):
+        # Lay out every section first, then fill each slot as its result lands.
+        slots = {}
+        for section in SECTION_VIEWS:
+            if selected_user != 'Overall' and section in OVERALL_SECTIONS:
+                continue
+            st.title(section)
+            # Top statistics always run; every other section waits for its toggle.
+            if section == "Top Statistics" or st.toggle(f"Show {section.lower()}", key=f"section_{section}"):
+                slots[section] = st.empty()
+                slots[section].caption(f"Analyzing {section.lower()}…")
+
+        jobs = {
+            section: functools.partial(SECTION_DATA[section], selected_user, df)
+            for section in slots
+        }
+        timings = []
+        # Today is part of the key: current streaks are measured up to today.
+        run_key = (file_hash, selected_user, datetime.date.today())
+        for result in get_section_runner().run(run_key, jobs):
+            with slots[result.name].container():
+                if result.error is not None:
+                    st.error(f"Could not analyze {result.name.lower()}: {result.error}")
+                else:
+                    SECTION_VIEWS[result.name](result.value)
+            timings.append({
+                "section": result.name,
+                "seconds": round(result.seconds, 3),
+                "cached": result.cached,
+            })
+
+        with st.expander("Section timings"):
+            st.dataframe(pd.DataFrame(timings).sort_values("seconds", ascending=False), hide_index=True)
+
+        get_analysis_cache().add_facets(file_hash, df)
@@ -1,148 +1,54 @@
-from urlextract import URLExtract
 import pandas as pd
-import plotly.express as px
-from wordcloud import WordCloud
-from collections import Counter
-import emoji
-import streamlit as st
 
-extract = URLExtract()
-
-# Cache stopwords loading
-@st.cache_data
-def _load_stopwords():
-    with open('stop_hinglish.txt', 'r', encoding='utf-8') as f:
-        return set(f.read().split())
+from aggregates import LONGEST_TOP_K, MONTH_NAMES, WEEKDAY_NAMES, cube_for
+from timelines import TIMELINE_MAX_POINTS, user_timelines
 
 
 # ---------------------- USER STATS ----------------------
 def user_stats(selected_user, df):
-    if selected_user != 'Overall':
-        df = df[df['user'] == selected_user].copy()
-
-    num_messages = df.shape[0]
-
-    # total words - vectorized
-    words = df['message'].str.split().explode()
-    num_words = words.shape[0]
-
-    # total media - vectorized
-    num_media_messages = (df['message'] == '<Media omitted>\n').sum()
-
-    # total links - optimized
-    extractor = URLExtract()
-    all_messages = ' '.join(df['message'].astype(str))
-    links = extractor.find_urls(all_messages)
-
-    return num_messages, num_words, num_media_messages, len(links)
+    totals = cube_for(df).totals_for(selected_user)
 
-
-# ---------------------- MOST BUSY USERS CHART ----------------------
-def most_busy_person(df):
-
-    s = df[df['user'] != "group_notification"]['user'].value_counts().head()
-
-    data = pd.DataFrame({"user": s.index, "count": s.values})
-
-    fig = px.bar(
-        data,
-        x="user",
-        y="count",
-        text="count",
-        title="Top 5 Most Active Users"
+    return (
+        int(totals["messages"]),
+        int(totals["words"]),
+        int(totals["media"]),
+        int(totals["links"]),
     )
 
-    fig.update_traces(textposition="outside", marker=dict(color="#7BA4FF"))
-    fig.update_layout(template="plotly_dark", title_x=0.5)
-
-    df = round((df['user'].value_counts() / df.shape[0]) * 100, 2).reset_index().rename(
-    columns={'index': 'name', 'user': 'percent'})
-    return fig,df
 
-def wordcloud(selected_user, df):
-    # Load stopwords from cache
-    stop_words = _load_stopwords()
+# ---------------------- MOST BUSY USERS ----------------------
+def most_busy_person(df):
+    messages = cube_for(df).user_totals["messages"]
 
-    # Specific user filter
-    if selected_user != 'Overall':
-        df = df[df['user'] == selected_user].copy()
+    s = messages.drop("group_notification", errors="ignore").sort_values(ascending=False).head()
 
-    # Remove group notifications + media msgs
-    temp = df[(df['user'] != 'group_notification') & (df['message'] != '<Media omitted>\n')].copy()
+    top_users = pd.DataFrame({"user": s.index, "count": s.values})
 
-    # Remove stopwords - optimized vectorized approach
-    def remove_stop_words_vectorized(messages):
-        words_list = messages.str.lower().str.split()
-        filtered = words_list.apply(lambda words: [w for w in words if w not in stop_words])
-        return filtered.str.join(' ')
+    share = round((messages.sort_values(ascending=False) / messages.sum()) * 100, 2)
+    df = pd.DataFrame({'name': share.index, 'percent': share.values})
+    return top_users,df
 
-    temp['message'] = remove_stop_words_vectorized(temp['message'])
-    
-    # WordCloud
-    wc = WordCloud(
-        width=500,
-        height=400,
-        min_font_size=10,
-        background_color='white'
-    )
+def word_frequencies(selected_user, df):
+    cube = cube_for(df)
 
-    df_wc = wc.generate(temp['message'].str.cat(sep=" "))
-    return df_wc
+    # Stopword-filtered word counts, already excluding notifications and media
+    return cube.counts_for(cube.word_counts, selected_user)
 
 
 def most_common_words(selected_user, df):
-    # Load stopwords from cache
-    stop_words = _load_stopwords()
-
-    # filter chats if needed
-    if selected_user != "Overall":
-        df = df[df['user'] == selected_user].copy()
-
-    # remove group notifications + media messages
-    temp = df[(df['user'] != "group_notification") & (df['message'] != "<Media omitted>\n")].copy()
-
-    # extract clean words - vectorized approach
-    words_series = temp['message'].str.lower().str.split().explode()
-    words_series = words_series[~words_series.isin(stop_words)]
-    words_series = words_series[words_series.str.len() > 0]  # Remove empty strings
-
     # top 20 most common
-    word_counts = words_series.value_counts().head(20)
+    word_counts = word_frequencies(selected_user, df).nlargest(20)
     most_common_df = pd.DataFrame({
         "word": word_counts.index,
         "count": word_counts.values
     })
 
-    # Plotly Express bar chart
-    fig = px.bar(
-        most_common_df,
-        x="count",
-        y="word",
-        orientation="h",
-        text="count",
-        title="Most Common Words"
-    )
-
-    fig.update_traces(textposition="outside")
-    fig.update_layout(
-        template="plotly_dark",
-        title_x=0.5,
-        yaxis={'categoryorder': 'total ascending'}
-    )
-
-    return most_common_df, fig
+    return most_common_df
 
 def emoji_helper(selected_user, df):
-    if selected_user != 'Overall':
-        df = df[df['user'] == selected_user].copy()
-
-    # Vectorized emoji extraction
-    emojis = df['message'].apply(
-        lambda msg: [c for c in str(msg) if c in emoji.EMOJI_DATA]
-    ).explode().dropna()
+    cube = cube_for(df)
 
-    # Convert to DataFrame
-    emoji_counts = emojis.value_counts()
+    emoji_counts = cube.counts_for(cube.emoji_counts, selected_user).sort_values(ascending=False)
     emoji_df = pd.DataFrame({
         'emoji': emoji_counts.index,
         'count': emoji_counts.values
@@ -151,10 +57,9 @@ def emoji_helper(selected_user, df):
     return emoji_df
 
 def monthly_timeline(selected_user,df):
-    if selected_user != 'Overall':
-        df = df[df['user'] == selected_user].copy()
+    activity = cube_for(df).activity_for(selected_user)
 
-    timeline = df.groupby(['year', 'month_num', 'month']).size().reset_index(name='message')
+    timeline = activity.groupby(['year', 'month_num', 'month'])['messages'].sum().reset_index(name='message')
 
     # Vectorized string concatenation
     timeline['time'] = timeline['month'] + "-" + timeline['year'].astype(str)
@@ -162,87 +67,113 @@ def monthly_timeline(selected_user,df):
     return timeline
 
 def daily_timeline(selected_user,df):
-    
-    if selected_user != 'Overall':
-        df = df[df['user'] == selected_user]
+    activity = cube_for(df).activity_for(selected_user)
 
-    daily_timeline = df.groupby('only_date').count()['message'].reset_index()
+    daily_timeline = activity.groupby('only_date')['messages'].sum().reset_index(name='message')
     
     return daily_timeline
 
-    
+def timeline(selected_user, df, max_points=TIMELINE_MAX_POINTS):
+    """Messages over time at a resolution that fits ``max_points`` points."""
+    return user_timelines(df, [selected_user], max_points=max_points)
 
-def week_activity_map(selected_user,df):
 
-    if selected_user != 'Overall':
-        df = df[df['user'] == selected_user]
+def _nonzero_counts(counts, labels, name):
+    counts = pd.Series(counts, index=pd.Index(labels, name=name), name='count')
+    return counts[counts > 0]
 
-    return df['day_name'].value_counts()
+def week_activity_map(selected_user,df):
+    block = cube_for(df).activity_tensor.select(selected_user)
 
-def month_activity_map(selected_user,df):
+    return _nonzero_counts(block.sum(axis=(0, 2)), WEEKDAY_NAMES, 'day_name').sort_values(ascending=False)
 
-    if selected_user != 'Overall':
-        df = df[df['user'] == selected_user]
+def month_activity_map(selected_user,df):
+    block = cube_for(df).activity_tensor.select(selected_user)
 
-    return df['month'].value_counts()
+    return _nonzero_counts(block.sum(axis=(1, 2)), MONTH_NAMES, 'month').sort_values(ascending=False)
 
 def active_hours(selected_user, df):
-    if selected_user != "Overall":
-        df = df[df["user"] == selected_user].copy()
-    else:
-        df = df.copy()
-
-    # Ensure hour column exists (should already be there from preprocessing)
-    if 'hour' not in df.columns:
-        df['hour'] = df['date'].dt.hour
-    
-    active = df['hour'].value_counts().sort_index()
+    block = cube_for(df).activity_tensor.select(selected_user)
+
+    return _nonzero_counts(block.sum(axis=(0, 1)), range(24), 'hour')
+
+def activity_heatmap(selected_user, df):
+    """Messages per weekday (rows, Monday first) and hour of day (columns)."""
+    block = cube_for(df).activity_tensor.select(selected_user)
+
+    return pd.DataFrame(
+        block.sum(axis=0),
+        index=pd.Index(WEEKDAY_NAMES, name='day_name'),
+        columns=pd.Index(range(24), name='hour'),
+    )
 
-    return active
 def longest_paragraph_by_user(df):
     """Find the longest paragraph/message for each user."""
-    # Filter out group notifications and media messages
-    filtered_df = df[
-        (df['user'] != 'group_notification') & 
-        (df['message'] != '<Media omitted>\n')
-    ].copy()
-    
-    if filtered_df.empty:
-        return pd.DataFrame(columns=['user', 'longest_message', 'char_count', 'word_count', 'date'])
-    
-    # Calculate message lengths
-    filtered_df['char_count'] = filtered_df['message'].str.len()
-    filtered_df['word_count'] = filtered_df['message'].str.split().str.len()
-    
-    # Find longest message for each user (by character count)
-    longest_messages = filtered_df.loc[
-        filtered_df.groupby('user')['char_count'].idxmax()
-    ][['user', 'message', 'char_count', 'word_count', 'date']].copy()
-    
-    longest_messages = longest_messages.rename(columns={'message': 'longest_message'})
-    longest_messages = longest_messages.sort_values('char_count', ascending=False)
-    
-    return longest_messages
+    longest = cube_for(df).longest_messages
+    return longest[longest["rank"] == 1].drop(columns="rank").reset_index(drop=True)
+
+def longest_messages(selected_user, df, top=LONGEST_TOP_K):
+    """The ``top`` longest messages of one user, or of anyone for 'Overall'."""
+    longest = cube_for(df).longest_messages
+    if selected_user != 'Overall':
+        longest = longest[longest["user"] == selected_user]
+    return longest.nlargest(top, "char_count", keep="first").drop(columns="rank").reset_index(drop=True)
+
+def length_stats(selected_user, df):
+    """Message count, mean/max/percentile characters and mean/max words."""
+    stats = cube_for(df).length_stats
+    if selected_user not in stats.index:
+        return pd.Series(0.0, index=stats.columns)
+    return stats.loc[selected_user]
+
+def length_histogram(selected_user, df):
+    """Message counts per length bucket, labelled by character range."""
+    cube = cube_for(df)
+    counts = cube.counts_for(cube.length_histogram, selected_user).sort_index()
+    labels = [str(b) if b <= 1 else f"{2 ** (b - 1)}-{2 ** b - 1}" for b in counts.index]
+    return pd.Series(counts.values, index=pd.Index(labels, name='chars'), name='count')
+
+
+
+def _streak_table(runs, as_of=None):
+    """Longest and current streak per user, with their dates.
+
+    A streak is current only if it reaches ``as_of`` (default: today) or
+    the day before, since today may simply not be over yet.
+    """
+    as_of = pd.Timestamp.today().normalize() if as_of is None else pd.Timestamp(as_of).normalize()
+    if runs.empty:
+        return pd.DataFrame(columns=["longest", "start", "end", "current", "current_start"])
+
+    best = runs.loc[runs.groupby("user", observed=True)["days"].idxmax()].set_index("user")
+    # Runs of one user never overlap, so at most one per user covers ``as_of``.
+    alive = runs[(runs["start"] <= as_of) & (runs["end"] >= as_of - pd.Timedelta(days=1))].set_index("user")
+    # Days after ``as_of`` do not count towards the streak current at ``as_of``.
+    current = (alive["end"].clip(upper=as_of) - alive["start"]).dt.days + 1
 
+    table = best[["days", "start", "end"]].rename(columns={"days": "longest"})
+    table["current"] = current.reindex(table.index, fill_value=0).astype("int64")
+    table["current_start"] = alive["start"].reindex(table.index)
+    return table
 
 
-def chat_streak(selected_user, df):
-    if selected_user != "Overall":
-        df = df[df["user"] == selected_user]
+def streak_summary(selected_user, df, as_of=None):
+    """Longest streak (with start/end) and current streak (with start) in days."""
+    table = _streak_table(cube_for(df).runs_for(selected_user), as_of)
+    if table.empty:
+        return pd.Series({"longest": 0, "start": pd.NaT, "end": pd.NaT, "current": 0, "current_start": pd.NaT})
+    return table.iloc[0]
 
-    df['only_date'] = df['date'].dt.date
-    unique_days = sorted(df['only_date'].unique())
 
-    longest = 1
-    current = 1
+def chat_streak(selected_user, df, as_of=None):
+    summary = streak_summary(selected_user, df, as_of)
 
-    for i in range(1, len(unique_days)):
-        if (unique_days[i] - unique_days[i-1]).days == 1:
-            current += 1
-            longest = max(longest, current)
-        else:
-            current = 1
+    return int(summary["longest"]), int(summary["current"])
 
-    return longest, current
 
+def top_streaks(df, top=10, as_of=None):
+    """Users ranked by their longest streak, with current streaks alongside."""
+    table = _streak_table(cube_for(df).streak_runs, as_of)
+    table = table.drop("group_notification", errors="ignore")
 
+    return table.sort_values(["longest", "current"], ascending=False).head(top).reset_index()
@@ -0,0 +1,196 @@
+"""Analyse many WhatsApp exports headlessly, in parallel across cores.
+
+    python batch_analyze.py exports/ more/chat.zip --out results --workers 8
+
+Every .txt/.zip found (directories are searched recursively) is parsed in a
+worker process; a single export is instead parsed in parallel shards.
+Per-chat statistics are written to ``<out>/<name>.json`` and, with
+``--parquet``, per-user totals to ``<out>/<name>.users.parquet``. With
+``--corpus DIR`` the messages are also added to a :class:`corpus.CorpusStore`.
+A combined ``summary.json``/``summary.csv`` lists every file with its status,
+so one bad export is reported and skipped instead of stopping the batch.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, Iterable, List
+
+import pandas as pd
+
+import backhand
+from aggregates import cube_for
+from analysis_cache import content_key, text_fingerprint
+from corpus import CorpusStore
+from ingest import iter_chat_text, iter_file_bytes, parse_chat_file
+
+_EXTENSIONS = (".txt", ".zip")
+_TOP_N = 20
+
+
+def find_exports(paths: Iterable[str]) -> List[str]:
+    """Expand files and directories into a sorted list of export paths."""
+    found = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, files in os.walk(path):
+                found.extend(
+                    os.path.join(root, name) for name in files if name.lower().endswith(_EXTENSIONS)
+                )
+        else:
+            found.append(path)
+    return sorted(set(found))
+
+
+def chat_statistics(df: pd.DataFrame) -> Dict[str, object]:
+    """Collect the dashboard's headline numbers for one parsed chat."""
+    num_messages, words, media, links = backhand.user_stats("Overall", df)
+    streak = backhand.streak_summary("Overall", df)
+    busy_day = backhand.week_activity_map("Overall", df)
+    busy_month = backhand.month_activity_map("Overall", df)
+    hours = backhand.active_hours("Overall", df)
+    top_words = backhand.most_common_words("Overall", df)
+    emojis = backhand.emoji_helper("Overall", df).head(_TOP_N)
+
+    users = cube_for(df).user_totals.drop("group_notification", errors="ignore")
+    return {
+        "messages": num_messages,
+        "words": words,
+        "media": media,
+        "links": links,
+        "first_message": df["date"].min().isoformat(),
+        "last_message": df["date"].max().isoformat(),
+        "longest_streak_days": int(streak["longest"]),
+        "longest_streak_start": streak["start"].date().isoformat(),
+        "longest_streak_end": streak["end"].date().isoformat(),
+        "current_streak_days": int(streak["current"]),
+        "busiest_day": busy_day.index[0] if len(busy_day) else None,
+        "busiest_month": busy_month.index[0] if len(busy_month) else None,
+        "busiest_hour": int(hours.idxmax()) if len(hours) else None,
+        "users": {user: {k: int(v) for k, v in row.items()} for user, row in users.iterrows()},
+        "top_words": dict(zip(top_words["word"], top_words["count"].tolist())),
+        "top_emojis": dict(zip(emojis["emoji"], emojis["count"].tolist())),
+    }
+
+
+def _output_stems(files: List[str], out_dir: str) -> Dict[str, str]:
+    """Give every export a distinct output prefix, numbering repeated base names."""
+    stems: Dict[str, str] = {}
+    seen: Dict[str, int] = {}
+    for path in files:
+        name = os.path.splitext(os.path.basename(path))[0]
+        seen[name] = seen.get(name, 0) + 1
+        suffix = f"-{seen[name]}" if seen[name] > 1 else ""
+        stems[path] = os.path.join(out_dir, name + suffix)
+    return stems
+
+
+def analyse_file(
+    path: str, stem: str, parquet: bool, parse_workers: int = 1, corpus: str = None
+) -> Dict[str, object]:
+    """Worker entry point: parse one export, write its outputs, return a summary row."""
+    start = time.perf_counter()
+    row: Dict[str, object] = {"file": path}
+    try:
+        with open(path, "rb") as f:
+            df, label = parse_chat_file(f, path, workers=parse_workers)
+            if corpus:
+                store = CorpusStore(corpus)
+                # A newer export of a stored chat replaces it rather than duplicating its history.
+                chat_id = store.find_chat(iter_chat_text(f, path)) or content_key(iter_file_bytes(f))
+                store.add_chat(chat_id, df, name=label, fingerprint=text_fingerprint(iter_chat_text(f, path)))
+        stats = chat_statistics(df)
+
+        with open(stem + ".json", "w", encoding="utf-8") as f:
+            json.dump(dict(stats, source=label), f, ensure_ascii=False, indent=2, default=str)
+        if parquet:
+            cube_for(df).user_totals.reset_index().to_parquet(stem + ".users.parquet", index=False)
+
+        seconds = time.perf_counter() - start
+        row.update(
+            status="ok",
+            output=stem + ".json",
+            messages=stats["messages"],
+            users=len(stats["users"]),
+            first_message=stats["first_message"],
+            last_message=stats["last_message"],
+            seconds=round(seconds, 3),
+            messages_per_sec=round(stats["messages"] / seconds, 1) if seconds else None,
+        )
+    except Exception as exc:  # one broken export must not stop the batch
+        row.update(status="failed", error=f"{type(exc).__name__}: {exc}",
+                   seconds=round(time.perf_counter() - start, 3))
+    return row
+
+
+def _print_row(done: int, total: int, row: Dict[str, object]) -> None:
+    detail = f"{row['messages']:,} messages" if row["status"] == "ok" else row["error"]
+    print(f"[{done}/{total}] {row['status']:<6} {row['file']} ({detail})", flush=True)
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("inputs", nargs="+", help="export files or directories")
+    parser.add_argument("--out", default="batch_results", help="output directory")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(),
+                        help="worker processes (default: all cores)")
+    parser.add_argument("--parquet", action="store_true",
+                        help="also write per-user totals as Parquet")
+    parser.add_argument("--corpus", metavar="DIR",
+                        help="also add every chat's messages to the corpus store in DIR")
+    args = parser.parse_args(argv)
+
+    files = find_exports(args.inputs)
+    if not files:
+        print("No .txt or .zip exports found.", file=sys.stderr)
+        return 1
+    os.makedirs(args.out, exist_ok=True)
+
+    stems = _output_stems(files, args.out)
+    rows = []
+    start = time.perf_counter()
+    if len(files) == 1:
+        # A single export gets the cores for its own parse instead.
+        rows.append(analyse_file(files[0], stems[files[0]], args.parquet, args.workers, args.corpus))
+        _print_row(1, 1, rows[0])
+    else:
+        with ProcessPoolExecutor(max_workers=args.workers) as pool:
+            futures = [
+                pool.submit(analyse_file, path, stems[path], args.parquet, corpus=args.corpus)
+                for path in files
+            ]
+            for done, future in enumerate(as_completed(futures), 1):
+                rows.append(future.result())
+                _print_row(done, len(files), rows[-1])
+    elapsed = time.perf_counter() - start
+
+    rows.sort(key=lambda row: row["file"])
+    summary = pd.DataFrame(rows)
+    # Failed files leave gaps; keep the counts integers rather than floats.
+    for column in ("messages", "users"):
+        if column in summary:
+            summary[column] = summary[column].astype("Int64")
+    ok = summary[summary["status"] == "ok"]
+    total_messages = int(ok["messages"].sum()) if not ok.empty else 0
+    throughput = total_messages / elapsed if elapsed else 0.0
+    summary.to_csv(os.path.join(args.out, "summary.csv"), index=False)
+    with open(os.path.join(args.out, "summary.json"), "w", encoding="utf-8") as f:
+        json.dump({
+            "files": len(files),
+            "succeeded": len(ok),
+            "failed": len(summary) - len(ok),
+            "messages": total_messages,
+            "seconds": round(elapsed, 3),
+            "messages_per_sec": round(throughput, 1),
+            "chats": [{column: row.get(column) for column in summary.columns} for row in rows],
+        }, f, ensure_ascii=False, indent=2, default=str)
+
+    print(f"\n{len(ok)}/{len(files)} chats analysed, {total_messages:,} messages "
+          f"in {elapsed:.1f}s ({throughput:,.0f} messages/sec)")
+    return 0 if len(ok) == len(files) else 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
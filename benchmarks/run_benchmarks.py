@@ -0,0 +1,189 @@
+"""Time and memory-profile parsing and every backhand analysis.
+
+Generates synthetic exports at each requested size, then measures
+``preprocessor.preprocess`` (and ``preprocess_parallel`` when more than one
+core is available), ``preprocessor.compact_schema`` (reporting the
+frame's memory footprint before and after) and each ``backhand`` function
+for 'Overall' and one user, on the compact frame the app analyses. Each
+analysis runs against a fresh copy of the frame so it pays for the
+aggregates it needs, as on a first click in the dashboard.
+
+    python -m benchmarks.run_benchmarks --sizes 10k 1m --save-baseline local
+    python -m benchmarks.run_benchmarks --sizes 10k 1m --compare local
+
+Results can be stored as a named baseline under ``benchmarks/baselines`` and
+later runs compared against it; the run exits non-zero when any measurement
+is slower than the baseline by more than ``--tolerance`` (and by at least
+``--min-delta`` seconds, to ignore timer noise on tiny inputs).
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Optional
+
+import backhand
+import preprocessor
+from benchmarks.synthetic_export import TIMESTAMP_FORMATS, ExportConfig, write_export
+
+BASELINE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines")
+
+_SUFFIXES = {"k": 1_000, "m": 1_000_000}
+
+
+def _parse_size(text: str) -> int:
+    text = text.lower().replace("_", "")
+    if text[-1] in _SUFFIXES:
+        return int(float(text[:-1]) * _SUFFIXES[text[-1]])
+    return int(text)
+
+
+def _measure(func: Callable[[], object], memory: bool) -> Dict[str, Optional[float]]:
+    gc.collect()
+    start = time.perf_counter()
+    func()
+    seconds = time.perf_counter() - start
+
+    peak_mb = None
+    if memory:
+        gc.collect()
+        tracemalloc.start()
+        func()
+        peak_mb = tracemalloc.get_traced_memory()[1] / 2**20
+        tracemalloc.stop()
+    return {"seconds": seconds, "peak_mb": peak_mb}
+
+
+def _analyses(user: str) -> Dict[str, Callable]:
+    calls: Dict[str, Callable] = {"most_busy_person": backhand.most_busy_person,
+                                  "longest_paragraph_by_user": backhand.longest_paragraph_by_user}
+    per_user = [
+        "user_stats", "word_frequencies", "most_common_words", "emoji_helper",
+        "monthly_timeline", "daily_timeline", "timeline", "week_activity_map",
+        "month_activity_map", "active_hours", "chat_streak",
+        "longest_messages", "length_stats", "length_histogram",
+    ]
+    for name in per_user:
+        func = getattr(backhand, name)
+        for selected in ("Overall", user):
+            label = "Overall" if selected == "Overall" else "user"
+            calls[f"{name}[{label}]"] = (lambda f, s: lambda df: f(s, df))(func, selected)
+    return calls
+
+
+def run_size(
+    messages: int, config: ExportConfig, memory: bool, workdir: str, parse_workers: int = 1
+) -> Dict[str, dict]:
+    config.messages = messages
+    path = os.path.join(workdir, f"chat_{messages}.txt")
+    write_export(path, config)
+    with open(path, "r", encoding="utf-8") as f:
+        data = f.read()
+
+    results: Dict[str, dict] = {}
+    results["preprocess"] = _measure(lambda: preprocessor.preprocess(data), memory)
+    results["preprocess"]["messages_per_sec"] = messages / results["preprocess"]["seconds"]
+    if parse_workers > 1:
+        results["preprocess_parallel"] = _measure(
+            lambda: preprocessor.preprocess_parallel(data, parse_workers), memory
+        )
+        results["preprocess_parallel"]["messages_per_sec"] = (
+            messages / results["preprocess_parallel"]["seconds"]
+        )
+    df = preprocessor.preprocess(data)
+    del data
+
+    results["compact_schema"] = _measure(lambda: preprocessor.compact_schema(df), memory)
+    compact = preprocessor.compact_schema(df)
+    results["compact_schema"]["frame_mb"] = preprocessor.memory_footprint(df)["total"] / 2**20
+    results["compact_schema"]["compact_mb"] = preprocessor.memory_footprint(compact)["total"] / 2**20
+    df = compact
+
+    user = sorted(u for u in df["user"].unique() if u != "group_notification")[0]
+    for name, call in _analyses(user).items():
+        results[name] = _measure(lambda: call(df.copy()), memory)
+    os.remove(path)
+    return results
+
+
+def _compare(
+    current: Dict[str, dict], baseline: Dict[str, dict], tolerance: float, min_delta: float
+) -> List[str]:
+    regressions = []
+    print(f"\n{'measurement':<48}{'baseline s':>12}{'now s':>12}{'ratio':>8}")
+    for size, measurements in current.items():
+        for name, now in measurements.items():
+            before = baseline.get(size, {}).get(name)
+            if before is None:
+                continue
+            ratio = now["seconds"] / before["seconds"] if before["seconds"] else float("inf")
+            slower = ratio > tolerance and now["seconds"] - before["seconds"] > min_delta
+            flag = "  <-- slower" if slower else ""
+            print(f"{size + ' ' + name:<48}{before['seconds']:>12.4f}{now['seconds']:>12.4f}{ratio:>8.2f}{flag}")
+            if flag:
+                regressions.append(f"{size} {name}")
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", nargs="+", default=["10k", "1m", "10m"],
+                        help="message counts, e.g. 10k 1m 10m")
+    parser.add_argument("--format", dest="timestamp_format", choices=sorted(TIMESTAMP_FORMATS),
+                        default=ExportConfig.timestamp_format)
+    parser.add_argument("--users", type=int, default=ExportConfig.users)
+    parser.add_argument("--no-memory", action="store_true",
+                        help="skip the tracemalloc pass (halves the run time)")
+    parser.add_argument("--parse-workers", type=int, default=os.cpu_count() or 1,
+                        help="also time preprocess_parallel with this many processes (1 skips it)")
+    parser.add_argument("--save-baseline", metavar="NAME")
+    parser.add_argument("--compare", metavar="NAME")
+    parser.add_argument("--tolerance", type=float, default=1.25,
+                        help="slowdown ratio that counts as a regression")
+    parser.add_argument("--min-delta", type=float, default=0.05,
+                        help="ignore slowdowns smaller than this many seconds")
+    args = parser.parse_args()
+
+    config = ExportConfig(users=args.users, timestamp_format=args.timestamp_format)
+    results: Dict[str, Dict[str, dict]] = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        for size in args.sizes:
+            messages = _parse_size(size)
+            print(f"benchmarking {messages:,} messages…", flush=True)
+            results[size] = run_size(messages, config, not args.no_memory, workdir, args.parse_workers)
+            for name, m in results[size].items():
+                peak = f"{m['peak_mb']:10.1f} MB" if m["peak_mb"] is not None else ""
+                print(f"  {name:<40}{m['seconds']:10.4f} s{peak}")
+            footprint = results[size]["compact_schema"]
+            print(f"  frame footprint: {footprint['frame_mb']:.1f} MB -> "
+                  f"{footprint['compact_mb']:.1f} MB compact")
+
+    if args.save_baseline:
+        os.makedirs(BASELINE_DIR, exist_ok=True)
+        payload = {
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "format": args.timestamp_format,
+            "results": results,
+        }
+        path = os.path.join(BASELINE_DIR, f"{args.save_baseline}.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(payload, f, indent=2)
+        print(f"\nbaseline saved to {path}")
+
+    if args.compare:
+        with open(os.path.join(BASELINE_DIR, f"{args.compare}.json"), "r", encoding="utf-8") as f:
+            baseline = json.load(f)["results"]
+        regressions = _compare(results, baseline, args.tolerance, args.min_delta)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) beyond {args.tolerance:.2f}x")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
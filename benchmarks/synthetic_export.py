@@ -0,0 +1,140 @@
+"""Synthetic WhatsApp export generator for benchmarks.
+
+Produces plain-text exports in the timestamp variants ``_TIME_STAMP_PATTERN``
+understands, with configurable size, senders, multi-line messages, emoji
+density and media/URL ratios. Output is streamed line by line, so exports
+with tens of millions of messages can be written without holding them in
+memory.
+
+    python -m benchmarks.synthetic_export --messages 100000 --format 24h_dmy chat.txt
+"""
+import argparse
+import datetime as dt
+import random
+from dataclasses import dataclass
+from typing import Iterator, List
+
+# name -> (date template, clock); "12h_nnbsp" puts U+202F before AM/PM and
+# "verbose" writes periods such as "in the morning".
+TIMESTAMP_FORMATS = {
+    "12h_mdy": ("{month}/{day}/{yy}", "12h"),
+    "12h_dmy": ("{day}/{month}/{yy}", "12h"),
+    "24h_dmy": ("{day:02d}/{month:02d}/{yyyy}", "24h"),
+    "24h_mdy": ("{month:02d}/{day:02d}/{yyyy}", "24h"),
+    "24h_dmy_dash": ("{day:02d}-{month:02d}-{yyyy}", "24h"),
+    "12h_narrow_nbsp": ("{month}/{day}/{yy}", "12h_nnbsp"),
+    "verbose_dmy": ("{day:02d}/{month:02d}/{yyyy}", "verbose"),
+}
+
+_WORDS = (
+    "hello yaar kal milte hain ok bhai lol haha meeting tomorrow office "
+    "chai chalo done sure thanks kya scene hai party weekend photo bhej "
+    "call karo abhi busy later pakka nice good night morning"
+).split()
+_EMOJIS = ["😂", "👍🏽", "❤️", "🔥", "🇮🇳", "👨‍👩‍👧", "🙏", "😭", "🎉", "1️⃣"]
+_URLS = ["https://example.com/article", "www.youtube.com/watch?v=abc123", "http://bit.ly/xyz"]
+_NOTIFICATIONS = ["{a} added {b}", "{a} left", "{a} changed the subject to \"{w}\""]
+
+
+@dataclass
+class ExportConfig:
+    messages: int = 10_000
+    users: int = 8
+    timestamp_format: str = "12h_mdy"
+    multiline_ratio: float = 0.05
+    emoji_density: float = 0.2
+    media_ratio: float = 0.05
+    url_ratio: float = 0.03
+    notification_ratio: float = 0.01
+    start: dt.datetime = dt.datetime(2015, 1, 1, 8, 0)
+    # The whole export spans about this long whatever its size, so large
+    # exports stay in range of two-digit years and keep realistic activity.
+    span_days: float = 5 * 365
+    seed: int = 0
+
+
+def _format_timestamp(when: dt.datetime, timestamp_format: str) -> str:
+    date_template, clock = TIMESTAMP_FORMATS[timestamp_format]
+    date = date_template.format(
+        day=when.day, month=when.month, yy=f"{when.year % 100:02d}", yyyy=when.year
+    )
+    if clock == "24h":
+        return f"{date}, {when:%H:%M}"
+
+    hour = when.hour % 12 or 12
+    if clock == "verbose":
+        if when.hour < 12:
+            period = "in the morning"
+        elif when.hour < 17:
+            period = "in the afternoon"
+        elif when.hour < 21:
+            period = "in the evening"
+        else:
+            period = "at night"
+        return f"{date}, {hour}:{when:%M} {period}"
+    separator = "\u202f" if clock == "12h_nnbsp" else " "
+    return f"{date}, {hour}:{when:%M}{separator}{'AM' if when.hour < 12 else 'PM'}"
+
+
+def _body(rng: random.Random, config: ExportConfig) -> str:
+    if rng.random() < config.media_ratio:
+        return "<Media omitted>"
+    words: List[str] = rng.choices(_WORDS, k=rng.randint(1, 15))
+    if rng.random() < config.url_ratio:
+        words.insert(rng.randrange(len(words) + 1), rng.choice(_URLS))
+    if rng.random() < config.emoji_density:
+        words.append("".join(rng.choices(_EMOJIS, k=rng.randint(1, 3))))
+    text = " ".join(words)
+    if rng.random() < config.multiline_ratio:
+        extra = rng.randint(1, 4)
+        text += "".join("\n" + " ".join(rng.choices(_WORDS, k=rng.randint(1, 10))) for _ in range(extra))
+    return text
+
+
+def generate_export(config: ExportConfig) -> Iterator[str]:
+    """Yield the export one record (with trailing newline) at a time."""
+    rng = random.Random(config.seed)
+    users = [f"User {i + 1}" for i in range(config.users)]
+    when = config.start
+    mean_gap_minutes = config.span_days * 24 * 60 / max(config.messages, 1)
+    for _ in range(config.messages):
+        when += dt.timedelta(minutes=rng.expovariate(1 / mean_gap_minutes))
+        stamp = _format_timestamp(when, config.timestamp_format)
+        if rng.random() < config.notification_ratio:
+            a, b = rng.sample(users, 2) if len(users) > 1 else (users[0], users[0])
+            note = rng.choice(_NOTIFICATIONS).format(a=a, b=b, w=rng.choice(_WORDS))
+            yield f"{stamp} - {note}\n"
+        else:
+            yield f"{stamp} - {rng.choice(users)}: {_body(rng, config)}\n"
+
+
+def write_export(path: str, config: ExportConfig) -> int:
+    """Write a synthetic export to ``path`` and return the characters written."""
+    size = 0
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        for record in generate_export(config):
+            size += f.write(record)
+    return size
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("output")
+    parser.add_argument("--messages", type=int, default=ExportConfig.messages)
+    parser.add_argument("--users", type=int, default=ExportConfig.users)
+    parser.add_argument("--format", dest="timestamp_format", choices=sorted(TIMESTAMP_FORMATS),
+                        default=ExportConfig.timestamp_format)
+    parser.add_argument("--multiline-ratio", type=float, default=ExportConfig.multiline_ratio)
+    parser.add_argument("--emoji-density", type=float, default=ExportConfig.emoji_density)
+    parser.add_argument("--media-ratio", type=float, default=ExportConfig.media_ratio)
+    parser.add_argument("--url-ratio", type=float, default=ExportConfig.url_ratio)
+    parser.add_argument("--span-days", type=float, default=ExportConfig.span_days)
+    parser.add_argument("--seed", type=int, default=ExportConfig.seed)
+    args = parser.parse_args()
+
+    output = args.__dict__.pop("output")
+    write_export(output, ExportConfig(**vars(args)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+import plotly.express as px
+
+
+# ---------------------- MOST BUSY USERS CHART ----------------------
+def most_busy_person(top_users):
+    fig = px.bar(
+        top_users,
+        x="user",
+        y="count",
+        text="count",
+        title="Top 5 Most Active Users"
+    )
+
+    fig.update_traces(textposition="outside", marker=dict(color="#7BA4FF"))
+    fig.update_layout(template="plotly_dark", title_x=0.5)
+    return fig
+
+
+# ---------------------- TIMELINES ----------------------
+def monthly_timeline(timeline):
+    fig = px.area(
+        timeline,
+        x='time',
+        y='message',
+        title='Monthly Timeline',
+    )
+
+    fig.update_layout(
+        template="plotly_dark",
+        title_x=0.5,
+        xaxis_title="Time",
+        yaxis_title="Messages Count"
+    )
+    return fig
+
+
+RESOLUTION_TITLES = {"day": "Daily", "week": "Weekly", "month": "Monthly"}
+
+
+def timeline(timeline):
+    points = timeline.points
+    several = points["user"].nunique() > 1
+    fig = (px.line if several else px.area)(
+        points,
+        x="date",
+        y="message",
+        color="user" if several else None,
+        title=f"{RESOLUTION_TITLES[timeline.resolution]} Timeline",
+    )
+    fig.update_layout(title_x=0.5)
+    return fig
+
+
+# ---------------------- ACTIVITY MAP ----------------------
+def _activity_bar(counts, label, title):
+    data = counts.reset_index()
+    data.columns = [label, "messages"]
+
+    fig = px.bar(
+        data,
+        x=label,
+        y="messages",
+        title=title,
+        text="messages"
+    )
+    fig.update_traces(textposition="outside")
+    fig.update_layout(title_x=0.5)
+    return fig
+
+
+def week_activity_map(busy_day):
+    return _activity_bar(busy_day, "day", "Most Busy Day")
+
+
+def month_activity_map(busy_month):
+    return _activity_bar(busy_month, "month", "Most Busy Month")
+
+
+def hour_to_12h(hour):
+    """Convert a 24-hour clock hour to a '3 PM' style label."""
+    if hour == 0:
+        return "12 AM"
+    elif hour < 12:
+        return f"{hour} AM"
+    elif hour == 12:
+        return "12 PM"
+    else:
+        return f"{hour - 12} PM"
+
+
+HOUR_LABELS = tuple(hour_to_12h(hour) for hour in range(24))
+
+
+def active_hours(active):
+    fig = px.bar(
+        x=[HOUR_LABELS[hour] for hour in active.index],
+        y=active.values,
+        title="Active Hours (12-Hour Format)",
+        labels={"x": "Hour", "y": "Number of Messages"},
+        template="plotly_dark"
+    )
+
+    fig.update_layout(
+        title_x=0.5,
+        xaxis_tickangle=45
+    )
+    return fig
+
+
+def activity_heatmap(matrix):
+    fig = px.imshow(
+        matrix.to_numpy(),
+        x=[HOUR_LABELS[hour] for hour in matrix.columns],
+        y=list(matrix.index),
+        labels={"x": "Hour", "y": "Day", "color": "Messages"},
+        title="Weekly Activity Heatmap",
+        color_continuous_scale="Viridis",
+        aspect="auto",
+    )
+    fig.update_layout(title_x=0.5, xaxis_tickangle=45)
+    return fig
+
+
+# ---------------------- WORDS & EMOJIS ----------------------
+def wordcloud(frequencies, width=500, height=400, background_color='white'):
+    # Imported here: wordcloud pulls in PIL and numpy-heavy layout code.
+    from wordcloud import WordCloud
+
+    wc = WordCloud(
+        width=width,
+        height=height,
+        min_font_size=10,
+        background_color=background_color
+    )
+    return wc.generate_from_frequencies(dict(frequencies))
+
+
+def most_common_words(most_common_df):
+    fig = px.bar(
+        most_common_df,
+        x="count",
+        y="word",
+        orientation="h",
+        text="count",
+        title="Most Common Words"
+    )
+
+    fig.update_traces(textposition="outside")
+    fig.update_layout(
+        template="plotly_dark",
+        title_x=0.5,
+        yaxis={'categoryorder': 'total ascending'}
+    )
+    return fig
+
+
+def emoji_pie(emoji_df, top=10):
+    return px.pie(
+        emoji_df.head(top),
+        names='emoji',
+        values='count',
+        title="Top Emojis"
+    )
+
+
+def length_histogram(counts):
+    return _activity_bar(counts, "characters", "Message Length Distribution")
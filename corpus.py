@@ -0,0 +1,273 @@
+"""A local store of many parsed chats, queried together without loading them whole.
+
+Messages are appended to one Parquet dataset partitioned by chat, year and
+month (``chat=<id>/year=<y>/month=<m>/``). Within a partition rows are
+sorted by user and date, so the row-group statistics act as an index on both.
+Queries build one filter expression: chat and date bounds prune whole
+partition directories, and user and date predicates skip row groups
+before they are read. The matching rows are streamed in record batches and
+folded into running totals, so memory follows the batch size and the size of
+the answer, not the size of the corpus.
+
+    store = CorpusStore.from_env()
+    chat_id = store.find_chat(text) or content_key(raw)   # a re-export replaces its chat
+    store.add_chat(chat_id, df, name="Family.txt", fingerprint=text_fingerprint(text))
+    store.activity("hour", users=["Alice"])   # Alice's messages per hour, every chat
+"""
+import itertools
+import json
+import os
+import shutil
+from collections import Counter
+from typing import Callable, Dict, Iterable, List, Optional, Union
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+
+from aggregates import GROUP_NOTIFICATION, MEDIA_MESSAGE, MONTH_NAMES, WEEKDAY_NAMES
+from analysis_cache import longest_prefix
+from emoji_matcher import find_emojis
+from tokenizer import load_stopwords
+
+CORPUS_DIR_ENV = "CHAT_ANALYZER_CORPUS_DIR"
+
+_DEFAULT_CORPUS_DIR = os.path.join(os.path.expanduser("~"), ".local", "share", "whatsapp-chat-analyzer")
+_ROWS_PER_GROUP = 64 * 1024
+
+_SCHEMA = pa.schema([
+    ("date", pa.timestamp("ns")),
+    ("user", pa.string()),
+    ("message", pa.string()),
+    ("hour", pa.int8()),
+    ("weekday", pa.int8()),
+    ("chat", pa.string()),
+    ("year", pa.int16()),
+    ("month", pa.int8()),
+])
+_PARTITIONING = ds.partitioning(
+    pa.schema([("chat", pa.string()), ("year", pa.int16()), ("month", pa.int8())]), flavor="hive"
+)
+
+_BREAKDOWNS = {
+    "hour": ("hour", range(24)),
+    "weekday": ("weekday", WEEKDAY_NAMES),
+    "month": ("month", MONTH_NAMES),
+}
+
+
+def _month_key(value: pd.Timestamp) -> ds.Expression:
+    """Partition filter for rows in or after (year, month) of ``value``."""
+    year, month = ds.field("year"), ds.field("month")
+    return (year > value.year) | ((year == value.year) & (month >= value.month))
+
+
+class CorpusStore:
+    """Partitioned Parquet dataset of messages from many chats, plus a chat catalog."""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._messages = os.path.join(directory, "messages")
+        self._catalog = os.path.join(directory, "chats")
+        os.makedirs(self._messages, exist_ok=True)
+        os.makedirs(self._catalog, exist_ok=True)
+
+    @classmethod
+    def from_env(cls) -> "CorpusStore":
+        return cls(os.environ.get(CORPUS_DIR_ENV, _DEFAULT_CORPUS_DIR))
+
+    # ---------------------- CHATS ----------------------
+    def add_chat(
+        self,
+        chat_id: str,
+        df: pd.DataFrame,
+        name: Optional[str] = None,
+        fingerprint: Optional[Dict[str, object]] = None,
+    ) -> None:
+        """Store the messages of a preprocessed chat, replacing any earlier copy of it.
+
+        ``chat_id`` names the partition (e.g. the upload's content key), so it
+        may only hold letters, digits, '-' and '_'. ``fingerprint`` is the
+        export's :func:`analysis_cache.text_fingerprint`, which lets
+        :meth:`find_chat` recognise later exports of the same chat.
+        """
+        if not chat_id or not all(c.isalnum() or c in "-_" for c in chat_id):
+            raise ValueError(f"Invalid chat id: {chat_id!r}")
+        dates = df["date"]
+        frame = pd.DataFrame({
+            "date": dates,
+            "user": df["user"].astype(str),
+            "message": df["message"].astype(str),
+            "hour": dates.dt.hour.astype("int8"),
+            "weekday": dates.dt.weekday.astype("int8"),
+            "chat": chat_id,
+            "year": dates.dt.year.astype("int16"),
+            "month": dates.dt.month.astype("int8"),
+        }).sort_values(["user", "date"], kind="stable")
+        table = pa.Table.from_pandas(frame, preserve_index=False).cast(_SCHEMA)
+
+        self.remove_chat(chat_id)
+        ds.write_dataset(
+            table, self._messages, format="parquet", partitioning=_PARTITIONING,
+            basename_template="part-{i}.parquet", existing_data_behavior="overwrite_or_ignore",
+            max_rows_per_group=_ROWS_PER_GROUP, min_rows_per_group=min(_ROWS_PER_GROUP, len(table)),
+        )
+        entry = {
+            "name": name or chat_id,
+            "messages": len(frame),
+            "users": sorted(frame["user"].unique()),
+            "first_message": dates.min().isoformat(),
+            "last_message": dates.max().isoformat(),
+            "text": fingerprint,
+        }
+        # The catalog entry goes last: a chat is listed only once its messages are in.
+        with open(os.path.join(self._catalog, f"{chat_id}.json"), "w", encoding="utf-8") as f:
+            json.dump(entry, f, ensure_ascii=False)
+
+    def find_chat(self, text: Union[str, Iterable[str]]) -> Optional[str]:
+        """The stored chat a newer export ``text`` continues, or None.
+
+        Re-exports of a chat repeat its history, so they are stored under the
+        id of the chat whose export text is the longest prefix of ``text``;
+        otherwise cross-chat totals would count that history once per export.
+        """
+        candidates: Dict[int, Dict[str, str]] = {}
+        for chat_id, fingerprint in self._fingerprints().items():
+            candidates.setdefault(fingerprint["chars"], {})[fingerprint["sha256"]] = chat_id
+        found = longest_prefix(candidates, text)
+        return None if found is None else found[0]
+
+    def _fingerprints(self) -> Dict[str, Dict[str, object]]:
+        fingerprints = {}
+        for file in os.listdir(self._catalog):
+            if file.endswith(".json"):
+                with open(os.path.join(self._catalog, file), "r", encoding="utf-8") as f:
+                    fingerprint = json.load(f).get("text")
+                if fingerprint:
+                    fingerprints[file[:-len(".json")]] = fingerprint
+        return fingerprints
+
+    def remove_chat(self, chat_id: str) -> None:
+        try:
+            os.remove(os.path.join(self._catalog, f"{chat_id}.json"))
+        except FileNotFoundError:
+            pass
+        shutil.rmtree(os.path.join(self._messages, f"chat={chat_id}"), ignore_errors=True)
+
+    def chats(self) -> pd.DataFrame:
+        """One row per stored chat: id, name, message count, users and date range."""
+        rows = []
+        for file in sorted(os.listdir(self._catalog)):
+            if file.endswith(".json"):
+                with open(os.path.join(self._catalog, file), "r", encoding="utf-8") as f:
+                    rows.append(dict(json.load(f), chat=file[:-len(".json")]))
+        columns = ["chat", "name", "messages", "users", "first_message", "last_message"]
+        return pd.DataFrame(rows, columns=columns)
+
+    def users(self) -> List[str]:
+        """Everyone who wrote in any stored chat."""
+        return sorted(set(itertools.chain.from_iterable(self.chats()["users"])) - {GROUP_NOTIFICATION})
+
+    # ---------------------- SCANNING ----------------------
+    def _dataset(self) -> ds.Dataset:
+        return ds.dataset(self._messages, format="parquet", schema=_SCHEMA, partitioning=_PARTITIONING)
+
+    def _filter(
+        self,
+        users: Optional[Iterable[str]],
+        chats: Optional[Iterable[str]],
+        start: Optional[object],
+        end: Optional[object],
+        text_only: bool = False,
+    ) -> Optional[ds.Expression]:
+        conditions: List[ds.Expression] = []
+        if chats is not None:
+            conditions.append(ds.field("chat").isin(list(chats)))
+        if users is not None:
+            conditions.append(ds.field("user").isin(list(users)))
+        if start is not None:
+            start = pd.Timestamp(start)
+            conditions += [_month_key(start), ds.field("date") >= pa.scalar(start.to_pydatetime())]
+        if end is not None:
+            after = pd.Timestamp(end).normalize() + pd.Timedelta(days=1)
+            conditions += [~_month_key(after + pd.offsets.MonthBegin(0)),
+                           ds.field("date") < pa.scalar(after.to_pydatetime())]
+        if text_only:
+            conditions += [ds.field("user") != GROUP_NOTIFICATION, ds.field("message") != MEDIA_MESSAGE]
+        return None if not conditions else _all(conditions)
+
+    def _fold(
+        self,
+        columns: List[str],
+        fold: Callable[[pd.DataFrame], Counter],
+        users: Optional[Iterable[str]] = None,
+        chats: Optional[Iterable[str]] = None,
+        start: Optional[object] = None,
+        end: Optional[object] = None,
+        text_only: bool = False,
+    ) -> Counter:
+        """Fold ``fold`` over the matching rows one record batch at a time."""
+        total: Counter = Counter()
+        scanner = self._dataset().scanner(
+            columns=columns, filter=self._filter(users, chats, start, end, text_only)
+        )
+        for batch in scanner.to_batches():
+            if batch.num_rows:
+                total.update(fold(batch.to_pandas()))
+        return total
+
+    # ---------------------- ANALYTICS ----------------------
+    # Every query takes the same optional scope: ``users`` and ``chats`` (ids)
+    # to include, and a ``start``/``end`` range of days, both included.
+    def messages_per_user(self, **scope) -> pd.Series:
+        counts = self._fold(["user"], lambda b: b["user"].value_counts().to_dict(), **scope)
+        return pd.Series(counts, dtype="int64", name="count").rename_axis("user").sort_values(ascending=False)
+
+    def activity(self, by: str = "hour", **scope) -> pd.Series:
+        """Message counts by ``'hour'``, ``'weekday'`` or ``'month'``, in calendar order."""
+        if by not in _BREAKDOWNS:
+            raise ValueError(f"Unknown breakdown {by!r}; expected one of {sorted(_BREAKDOWNS)}.")
+        column, labels = _BREAKDOWNS[by]
+        counts = self._fold([column], lambda b: b[column].value_counts().to_dict(), **scope)
+        # Months are stored 1-12, weekdays and hours from 0.
+        offset = 1 if by == "month" else 0
+        values = [counts.get(code + offset, 0) for code in range(len(labels))]
+        return pd.Series(values, index=pd.Index(list(labels), name=by), dtype="int64", name="count")
+
+    def timeline(self, freq: str = "D", **scope) -> pd.DataFrame:
+        """Messages per day (``'D'``) or month (``'M'``), like the dashboard timelines."""
+        if freq not in ("D", "M"):
+            raise ValueError("freq must be 'D' or 'M'.")
+
+        def fold(batch: pd.DataFrame) -> Counter:
+            dates = batch["date"]
+            periods = dates.dt.normalize() if freq == "D" else dates.dt.to_period("M").dt.to_timestamp()
+            return periods.value_counts().to_dict()
+
+        counts = self._fold(["date"], fold, **scope)
+        timeline = pd.Series(counts, dtype="int64").sort_index()
+        return timeline.rename_axis("date").reset_index(name="message")
+
+    def most_common_words(self, top: int = 20, **scope) -> pd.DataFrame:
+        stop_words = load_stopwords()
+
+        def fold(batch: pd.DataFrame) -> Counter:
+            words = itertools.chain.from_iterable(text.lower().split() for text in batch["message"])
+            return Counter(word for word in words if word not in stop_words)
+
+        counts = self._fold(["message"], fold, text_only=True, **scope)
+        return pd.DataFrame(counts.most_common(top), columns=["word", "count"])
+
+    def emoji_counts(self, top: Optional[int] = None, **scope) -> pd.DataFrame:
+        def fold(batch: pd.DataFrame) -> Counter:
+            return Counter(itertools.chain.from_iterable(map(find_emojis, batch["message"])))
+
+        counts = self._fold(["message"], fold, **scope)
+        return pd.DataFrame(counts.most_common(top), columns=["emoji", "count"])
+
+
+def _all(conditions: List[ds.Expression]) -> ds.Expression:
+    combined = conditions[0]
+    for condition in conditions[1:]:
+        combined = combined & condition
+    return combined
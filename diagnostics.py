@@ -0,0 +1,208 @@
+"""Stage-level timing of chat ingestion, with an opt-in profiling mode.
+
+The decoder and parser wrap each stage in :func:`stage`. Nothing is recorded
+unless a :func:`capture` is active in the current context, so uninstrumented
+calls pay one context-variable lookup per stage. Within a capture every stage
+accumulates wall time, the bytes or characters it consumed, the messages it
+produced and the process's peak RSS; with ``trace_memory`` it also records
+the stage's own peak allocation through ``tracemalloc``, and with ``profile``
+the whole capture runs under ``cProfile``.
+
+    with diagnostics.capture() as report:
+        df, label = ingest.parse_chat_file(f, name)
+    report.to_dict()
+
+Streaming stages run interleaved chunk by chunk, so a stage's numbers are
+summed over all of its calls. A stage entered while another one is open is
+counted as part of the outer stage, so shares never overlap.
+"""
+import contextlib
+import contextvars
+import cProfile
+import io
+import pstats
+import sys
+import time
+import tracemalloc
+from dataclasses import asdict, dataclass, field
+from typing import Dict, Iterator, List, Optional
+
+import pandas as pd
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+_PROFILE_LINES = 30
+_ALLOCATION_LINES = 15
+
+_ACTIVE: "contextvars.ContextVar[Optional[ParseReport]]" = contextvars.ContextVar(
+    "parse_report", default=None
+)
+
+
+def _peak_rss_bytes() -> Optional[int]:
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS reports bytes, Linux and the BSDs kilobytes.
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+@dataclass
+class StageStats:
+    """Totals for one ingestion stage over all of its calls."""
+    name: str
+    calls: int = 0
+    seconds: float = 0.0
+    bytes: int = 0                        # raw input consumed (byte stages)
+    chars: int = 0                        # decoded text consumed (text stages)
+    messages: int = 0                     # messages produced
+    peak_rss_bytes: Optional[int] = None  # process high-water mark after the stage
+    peak_alloc_bytes: Optional[int] = None  # tracemalloc peak within the stage
+
+    @property
+    def mb_per_second(self) -> Optional[float]:
+        volume = self.bytes or self.chars
+        return volume / 1e6 / self.seconds if volume and self.seconds else None
+
+    @property
+    def messages_per_second(self) -> Optional[float]:
+        return self.messages / self.seconds if self.messages and self.seconds else None
+
+
+@dataclass
+class ParseReport:
+    """Per-stage statistics of one ingestion, in the order stages first ran."""
+    stages: Dict[str, StageStats] = field(default_factory=dict)
+    seconds: float = 0.0
+    profile: Optional[str] = None         # cProfile listing, by cumulative time
+    allocations: Optional[str] = None     # top tracemalloc allocation sites
+    trace_memory: bool = False
+    open_stage: Optional[str] = field(default=None, repr=False)  # stage being timed now
+
+    def stage(self, name: str) -> StageStats:
+        stats = self.stages.get(name)
+        if stats is None:
+            stats = self.stages[name] = StageStats(name)
+        return stats
+
+    def to_dict(self) -> Dict[str, object]:
+        """JSON-friendly form of the report."""
+        stages: List[Dict[str, object]] = []
+        for stats in self.stages.values():
+            row = asdict(stats)
+            row["mb_per_second"] = stats.mb_per_second
+            row["messages_per_second"] = stats.messages_per_second
+            stages.append(row)
+        return {
+            "seconds": self.seconds,
+            "stages": stages,
+            "profile": self.profile,
+            "allocations": self.allocations,
+        }
+
+    def to_frame(self) -> pd.DataFrame:
+        """One row per stage, in readable units."""
+        rows = [
+            {
+                "stage": stats.name,
+                "calls": stats.calls,
+                "seconds": round(stats.seconds, 4),
+                "share": round(stats.seconds / self.seconds, 3) if self.seconds else None,
+                "MB/s": _round(stats.mb_per_second, 1),
+                "messages/s": _round(stats.messages_per_second, 0),
+                "peak RSS MB": _megabytes(stats.peak_rss_bytes),
+                "peak alloc MB": _megabytes(stats.peak_alloc_bytes),
+            }
+            for stats in self.stages.values()
+        ]
+        frame = pd.DataFrame(rows)
+        if not self.trace_memory and not frame.empty:
+            frame = frame.drop(columns="peak alloc MB")
+        return frame
+
+
+def _round(value: Optional[float], digits: int) -> Optional[float]:
+    return None if value is None else round(value, digits)
+
+
+def _megabytes(value: Optional[int]) -> Optional[float]:
+    return None if value is None else round(value / 2**20, 1)
+
+
+class _Counters:
+    """What a stage reports about its own work; discarded outside a capture."""
+    __slots__ = ("bytes", "chars", "messages")
+
+    def __init__(self, bytes: int = 0, chars: int = 0, messages: int = 0):
+        self.bytes, self.chars, self.messages = bytes, chars, messages
+
+
+@contextlib.contextmanager
+def stage(name: str, bytes: int = 0, chars: int = 0, messages: int = 0) -> Iterator[_Counters]:
+    """Time the enclosed block as stage ``name`` of the active capture.
+
+    Volumes known up front are passed as arguments; ones only known
+    afterwards are added to the yielded counters.
+    """
+    counters = _Counters(bytes, chars, messages)
+    report = _ACTIVE.get()
+    if report is None or report.open_stage is not None:
+        yield counters
+        return
+
+    report.open_stage = name
+    if report.trace_memory:
+        tracemalloc.reset_peak()
+        baseline = tracemalloc.get_traced_memory()[0]
+    start = time.perf_counter()
+    try:
+        yield counters
+    finally:
+        report.open_stage = None
+        stats = report.stage(name)
+        stats.seconds += time.perf_counter() - start
+        stats.calls += 1
+        stats.bytes += counters.bytes
+        stats.chars += counters.chars
+        stats.messages += counters.messages
+        stats.peak_rss_bytes = _peak_rss_bytes()
+        if report.trace_memory:
+            peak = tracemalloc.get_traced_memory()[1] - baseline
+            stats.peak_alloc_bytes = max(stats.peak_alloc_bytes or 0, peak)
+
+
+@contextlib.contextmanager
+def capture(profile: bool = False, trace_memory: bool = False) -> Iterator[ParseReport]:
+    """Record every stage run in this context into the yielded report.
+
+    ``profile`` runs the block under ``cProfile``; ``trace_memory`` traces
+    allocations (several times slower, for one-off diagnosis).
+    """
+    report = ParseReport(trace_memory=trace_memory)
+    token = _ACTIVE.set(report)
+    profiler = cProfile.Profile() if profile else None
+    started_tracing = trace_memory and not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start()
+    if profiler is not None:
+        profiler.enable()
+    start = time.perf_counter()
+    try:
+        yield report
+    finally:
+        report.seconds = time.perf_counter() - start
+        if profiler is not None:
+            profiler.disable()
+        if trace_memory:
+            top = tracemalloc.take_snapshot().statistics("lineno")[:_ALLOCATION_LINES]
+            report.allocations = "\n".join(str(line) for line in top)
+        if started_tracing:
+            tracemalloc.stop()
+        if profiler is not None:
+            listing = io.StringIO()
+            pstats.Stats(profiler, stream=listing).sort_stats("cumulative").print_stats(_PROFILE_LINES)
+            report.profile = listing.getvalue()
+        _ACTIVE.reset(token)
@@ -0,0 +1,76 @@
+import functools
+import re
+from typing import Dict, List, Tuple
+
+import pandas as pd
+
+_END = ""
+# Gaps up to this many code points between emoji start characters are folded
+# into one range of the candidate class; the trie walk rejects false hits.
+_RANGE_GAP = 256
+
+
+@functools.lru_cache(maxsize=None)
+def _matcher() -> Tuple[Dict[str, dict], "re.Pattern[str]"]:
+    """Build the emoji trie and a character class of the characters that start one.
+
+    The class is kept to a couple of dozen ranges: Python's ``re`` checks a
+    non-BMP class range by range, and a single alternation over every emoji
+    would be tried branch by branch at every position.
+    """
+    import emoji  # the emoji table is large; load it only when needed
+
+    trie: Dict[str, dict] = {}
+    for sequence in emoji.EMOJI_DATA:
+        node = trie
+        for char in sequence:
+            node = node.setdefault(char, {})
+        node[_END] = {}
+
+    ranges: List[List[int]] = []
+    for code in sorted(ord(char) for char in trie):
+        if ranges and code >= 0x2000 and code - ranges[-1][1] <= _RANGE_GAP:
+            ranges[-1][1] = code
+        else:
+            ranges.append([code, code])
+    parts = (
+        re.escape(chr(lo)) if lo == hi else f"{re.escape(chr(lo))}-{re.escape(chr(hi))}"
+        for lo, hi in ranges
+    )
+    return trie, re.compile("[" + "".join(parts) + "]")
+
+
+def find_emojis(text: str) -> List[str]:
+    """Return the emojis in ``text`` in order, longest sequence first.
+
+    ZWJ families, skin-tone modifiers, keycaps and flags come back as one
+    emoji each rather than as their component code points.
+    """
+    # Every emoji contains at least one non-ASCII code point.
+    if text.isascii():
+        return []
+
+    trie, candidates = _matcher()
+    found: List[str] = []
+    resume = 0
+    for hit in candidates.finditer(text):
+        start = hit.start()
+        if start < resume:
+            continue
+        node, end, pos = trie, -1, start
+        while pos < len(text):
+            node = node.get(text[pos])
+            if node is None:
+                break
+            pos += 1
+            if _END in node:
+                end = pos
+        if end > 0:
+            found.append(text[start:end])
+            resume = end
+    return found
+
+
+def extract_emojis(messages: pd.Series) -> pd.Series:
+    """Return, for each message, the list of emojis it contains in order."""
+    return messages.astype(str).map(find_emojis)
@@ -0,0 +1,197 @@
+import codecs
+import io
+import zipfile
+from typing import BinaryIO, Iterator, Tuple
+
+import pandas as pd
+
+import preprocessor
+from diagnostics import ParseReport, capture, stage
+
+_CHUNK_SIZE = 1 << 20
+_SNIFF_SIZE = 64 * 1024
+
+_BOMS = (
+    (codecs.BOM_UTF8, "utf-8-sig"),
+    (codecs.BOM_UTF16_LE, "utf-16"),
+    (codecs.BOM_UTF16_BE, "utf-16"),
+)
+
+
+def sniff_encoding(sample: bytes) -> str:
+    """Pick the export's encoding from its BOM or the first bytes of text.
+
+    Without a BOM, mostly-ASCII UTF-16 shows up as a NUL in every other byte;
+    otherwise UTF-8 is assumed when the sample decodes, and Latin-1 if not.
+    """
+    for bom, encoding in _BOMS:
+        if sample.startswith(bom):
+            return encoding
+    if sample[1::2].count(0) > len(sample) // 4:
+        return "utf-16-le"
+    if sample[0::2].count(0) > len(sample) // 4:
+        return "utf-16-be"
+    try:
+        # Not final: a multi-byte character cut off at the sample's end is fine.
+        codecs.getincrementaldecoder("utf-8")().decode(sample)
+    except UnicodeDecodeError:
+        return "iso-8859-1"
+    return "utf-8"
+
+
+def _decode_chat_bytes(chat_bytes: bytes) -> str:
+    """Decode WhatsApp chat bytes in the encoding sniffed from their start."""
+    with stage("decode", bytes=len(chat_bytes)):
+        return chat_bytes.decode(sniff_encoding(chat_bytes[:_SNIFF_SIZE]), errors="replace")
+
+
+ZIP_SIGNATURES = (b"PK\x03\x04", b"PK\x05\x06", b"PK\x07\x08")
+
+
+def _chat_member(zipped: zipfile.ZipFile) -> zipfile.ZipInfo:
+    """Pick the largest .txt file of a WhatsApp export zip."""
+    txt_members = [
+        info for info in zipped.infolist()
+        if not info.is_dir() and info.filename.lower().endswith(".txt")
+    ]
+    if not txt_members:
+        raise ValueError("Zip archive does not contain a WhatsApp .txt export.")
+    return max(txt_members, key=lambda info: info.file_size)
+
+
+def _extract_txt_from_zip(file_bytes: bytes) -> Tuple[bytes, str]:
+    """Extract the largest .txt file from a WhatsApp export zip."""
+    try:
+        with zipfile.ZipFile(io.BytesIO(file_bytes)) as zipped:
+            chosen = _chat_member(zipped)
+            with stage("unzip", bytes=chosen.file_size), zipped.open(chosen) as chat_file:
+                return chat_file.read(), chosen.filename
+    except zipfile.BadZipFile as exc:
+        raise ValueError("Uploaded file is not a valid zip archive.") from exc
+
+
+def _looks_like_zip(file_bytes: bytes) -> bool:
+    """Check the magic number to infer zip archives even without .zip extension."""
+    return len(file_bytes) >= 4 and file_bytes[:4] in ZIP_SIGNATURES
+
+
+def decode_chat_file(file_bytes: bytes, name: str) -> Tuple[str, str]:
+    """Decode a raw .txt or .zip export and return chat text + file label."""
+    if not file_bytes:
+        raise ValueError("Uploaded file is empty.")
+
+    extracted_label = name or "uploaded file"
+
+    if (name or "").lower().endswith(".zip") or _looks_like_zip(file_bytes):
+        chat_bytes, extracted_label = _extract_txt_from_zip(file_bytes)
+    else:
+        chat_bytes = file_bytes
+
+    return _decode_chat_bytes(chat_bytes), extracted_label
+
+
+def load_chat_text(uploaded_file) -> Tuple[str, str]:
+    """Accept .txt or .zip uploads and return decoded chat text + file label."""
+    return decode_chat_file(uploaded_file.getvalue(), uploaded_file.name)
+
+
+def load_chat_path(path: str) -> Tuple[str, str]:
+    """Read a .txt or .zip export from disk and return chat text + file label."""
+    with open(path, "rb") as f:
+        return decode_chat_file(f.read(), path)
+
+
+# ---------------------- STREAMING ----------------------
+def iter_file_bytes(file_obj: BinaryIO, chunk_size: int = _CHUNK_SIZE) -> Iterator[bytes]:
+    """Yield a seekable binary file's content from the start, chunk by chunk."""
+    file_obj.seek(0)
+    return iter(lambda: file_obj.read(chunk_size), b"")
+
+
+def _is_zip_file(file_obj: BinaryIO, name: str) -> bool:
+    file_obj.seek(0)
+    head = file_obj.read(4)
+    if not head:
+        raise ValueError("Uploaded file is empty.")
+    return (name or "").lower().endswith(".zip") or _looks_like_zip(head)
+
+
+def chat_label(file_obj: BinaryIO, name: str) -> str:
+    """Return the label :func:`load_chat_text` would report, without decoding."""
+    if not _is_zip_file(file_obj, name):
+        return name or "uploaded file"
+    try:
+        with zipfile.ZipFile(file_obj) as zipped:
+            return _chat_member(zipped).filename
+    except zipfile.BadZipFile as exc:
+        raise ValueError("Uploaded file is not a valid zip archive.") from exc
+
+
+def iter_chat_text(
+    file_obj: BinaryIO, name: str, start: int = 0, chunk_size: int = _CHUNK_SIZE
+) -> Iterator[str]:
+    """Decode a .txt or .zip export incrementally, yielding text chunks.
+
+    The zip member is decompressed and decoded a chunk at a time, so memory
+    stays bounded by ``chunk_size`` however large the archive is. The first
+    ``start`` characters are skipped. Every call reads ``file_obj`` from the
+    beginning, so the text can be streamed more than once.
+    """
+    if _is_zip_file(file_obj, name):
+        try:
+            zipped = zipfile.ZipFile(file_obj)
+            member = zipped.open(_chat_member(zipped))
+        except zipfile.BadZipFile as exc:
+            raise ValueError("Uploaded file is not a valid zip archive.") from exc
+        read_stage = "unzip"
+    else:
+        file_obj.seek(0)
+        zipped, member = None, file_obj
+        read_stage = "read"
+
+    try:
+        with stage(read_stage) as counters:
+            head = member.read(_SNIFF_SIZE)
+            counters.bytes = len(head)
+        decoder = codecs.getincrementaldecoder(sniff_encoding(head))(errors="replace")
+        chunk = head
+        while True:
+            final = not chunk
+            with stage("decode", bytes=len(chunk)):
+                text = decoder.decode(chunk, final=final)
+            if start:
+                skipped = min(start, len(text))
+                text, start = text[skipped:], start - skipped
+            if text:
+                yield text
+            if final:
+                return
+            with stage(read_stage) as counters:
+                chunk = member.read(chunk_size)
+                counters.bytes = len(chunk)
+    finally:
+        if zipped is not None:
+            member.close()
+            zipped.close()
+
+
+def parse_chat_file(file_obj: BinaryIO, name: str, workers: int = 1) -> Tuple[pd.DataFrame, str]:
+    """Stream a .txt or .zip export into a compact analysis frame; return it + file label.
+
+    With ``workers`` above one the decoded text is held in memory and parsed
+    in that many processes instead (see :func:`preprocessor.preprocess_parallel`).
+    """
+    if workers > 1:
+        df = preprocessor.preprocess_parallel("".join(iter_chat_text(file_obj, name)), workers)
+    else:
+        df = preprocessor.preprocess_stream(iter_chat_text(file_obj, name))
+    return preprocessor.compact_schema(df), chat_label(file_obj, name)
+
+
+def diagnose_chat_file(
+    file_obj: BinaryIO, name: str, profile: bool = False, trace_memory: bool = False
+) -> Tuple[pd.DataFrame, str, ParseReport]:
+    """:func:`parse_chat_file` under a diagnostics capture; also returns the stage report."""
+    with capture(profile=profile, trace_memory=trace_memory) as report:
+        df, label = parse_chat_file(file_obj, name)
+    return df, label, report
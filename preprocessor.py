@@ -1,13 +1,28 @@
+import codecs
+import itertools
+import os
 import re
-from typing import List
+from concurrent.futures import ProcessPoolExecutor
+from typing import IO, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
 
 import pandas as pd
 
+from diagnostics import stage
+
 _TIME_STAMP_PATTERN = re.compile(
     r"(\d{1,2}[\/\-]\d{1,2}[\/\-]\d{2,4},\s+\d{1,2}:\d{2}"
     r"(?:[\s\u202f]?(?:AM|PM|am|pm|A\.M\.|P\.M\.))?)\s[-–]\s"
 )
 
+_SENDER_PATTERN = re.compile(r"^(.+?):\s(.*)$", re.DOTALL)
+
+_TIME_STAMP_FIELDS = re.compile(
+    r"(\d{1,2})([\/\-])(\d{1,2})([\/\-])(\d{2,4}),\s+\d{1,2}:\d{2}"
+    r"(\s?)((?:AM|PM|am|pm|A\.M\.|P\.M\.))?$"
+)
+
+_FORMAT_SAMPLE_SIZE = 1000
+
 _VERBOSE_PERIODS = {
     "in the morning": "AM",
     "in the afternoon": "PM",
@@ -15,6 +30,16 @@ _VERBOSE_PERIODS = {
     "at night": "PM",
 }
 
+_NO_TIMESTAMPS_MESSAGE = (
+    "Could not detect WhatsApp timestamps. "
+    "Please ensure the export is in plain text format."
+)
+
+_STREAM_CHUNK_SIZE = 1 << 20
+_STREAM_BATCH_SIZE = 100_000
+
+ChatSource = Union[IO, Iterable[Union[str, bytes]]]
+
 
 def _normalise_export_text(raw: str) -> str:
     """Clean up unicode quirks and convert verbose period labels to AM/PM."""
@@ -32,58 +57,496 @@ def _split_records(text: str) -> List[str]:
     """Split chat export into alternating [timestamp, message] entries."""
     parts = re.split(_TIME_STAMP_PATTERN, text)[1:]
     if not parts:
-        raise ValueError(
-            "Could not detect WhatsApp timestamps. "
-            "Please ensure the export is in plain text format."
-        )
+        raise ValueError(_NO_TIMESTAMPS_MESSAGE)
     return parts
 
 
-def _parse_dates(date_strings: List[str]) -> pd.Series:
-    """Parse date strings trying both MM/DD and DD/MM interpretations."""
+def _sample(values: Sequence[str], size: int) -> List[str]:
+    """Pick up to ``size`` evenly spaced entries, always keeping the first and last."""
+    if len(values) <= size:
+        return list(values)
+    step = (len(values) - 1) / (size - 1)
+    return [values[round(i * step)] for i in range(size)]
+
+
+def detect_timestamp_format(
+    date_strings: Sequence[str], sample_size: int = _FORMAT_SAMPLE_SIZE
+) -> str:
+    """Infer one explicit ``strptime`` format from a sample of export timestamps.
+
+    Looks at date order (a field above 12 decides day vs month, MM/DD wins
+    when the sample is ambiguous), 2- or 4-digit years, the date separator and
+    12h vs 24h clock. Raises ``ValueError`` when the sample is inconsistent.
+    """
+    day_first = month_first = False
+    separators, year_lengths, periods, period_spacing = set(), set(), set(), set()
+    for stamp in _sample(date_strings, sample_size):
+        fields = _TIME_STAMP_FIELDS.match(stamp)
+        if fields is None:
+            raise ValueError(f"Unrecognised timestamp: {stamp!r}")
+        first, sep, second, sep2, year, spacing, period = fields.groups()
+        day_first |= int(first) > 12
+        month_first |= int(second) > 12
+        separators.update((sep, sep2))
+        year_lengths.add(len(year))
+        periods.add(period is not None)
+        if period is not None:
+            period_spacing.add(spacing)
+
+    if (day_first and month_first) or len(separators) != 1 or len(periods) != 1:
+        raise ValueError("Timestamps in the sample do not share one format.")
+    if year_lengths not in ({2}, {4}) or len(period_spacing) > 1:
+        raise ValueError("Timestamps in the sample do not share one format.")
+
+    sep = separators.pop()
+    year = "%y" if year_lengths == {2} else "%Y"
+    date_part = f"%d{sep}%m{sep}{year}" if day_first else f"%m{sep}%d{sep}{year}"
+    if periods.pop():
+        time_part = f"%I:%M{period_spacing.pop()}%p"
+    else:
+        time_part = "%H:%M"
+    return f"{date_part}, {time_part}"
+
+
+def _swap_date_order(date_format: str) -> str:
+    """Turn a MM/DD format into the equivalent DD/MM one and vice versa."""
+    return date_format.translate(str.maketrans({"d": "m", "m": "d"}))
+
+
+def _parse_dates(
+    date_strings: List[str], date_format: Optional[str] = None, swap: bool = True
+) -> Tuple[pd.Series, Optional[str]]:
+    """Parse export timestamps with one explicit format.
+
+    The format is sniffed from a sample unless ``date_format`` is given (for
+    instance one cached from an earlier upload of the same chat). If the
+    sample could not tell MM/DD from DD/MM and the first choice leaves rows
+    unparsed, the swapped order is tried. When no explicit format fits, the
+    old inference over both orders is used and ``None`` is returned as the
+    format. With ``swap=False`` only ``date_format`` itself is accepted.
+    """
+    if date_format is None:
+        try:
+            date_format = detect_timestamp_format(date_strings)
+        except ValueError:
+            date_format = None
+
+    if date_format is not None:
+        dates = pd.Series(date_strings)
+        if "%p" in date_format:
+            dates = dates.str.replace(".", "", regex=False)
+        candidates = (date_format, _swap_date_order(date_format)) if swap else (date_format,)
+        for candidate in candidates:
+            parsed = pd.to_datetime(dates, errors="coerce", format=candidate)
+            if parsed.notna().all():
+                return parsed, candidate
+        if not swap:
+            raise ValueError("Unable to parse timestamps in the uploaded chat.")
+
     for day_first in (False, True):
-        parsed = pd.to_datetime(date_strings, errors="coerce", dayfirst=day_first)
+        parsed = pd.to_datetime(
+            pd.Series(date_strings), errors="coerce", dayfirst=day_first
+        )
         if parsed.notna().all():
-            return parsed
+            return parsed, None
     raise ValueError("Unable to parse timestamps in the uploaded chat.")
 
 
-def preprocess(data: str) -> pd.DataFrame:
-    normalized = _normalise_export_text(data)
-    parts = _split_records(normalized)
+def _split_senders(user_messages: pd.Series) -> Tuple[pd.Series, pd.Series]:
+    """Split "sender: text" bodies in one vectorized pass.
+
+    Bodies without a sender prefix are system messages and are attributed to
+    ``group_notification`` with the body left untouched.
+    """
+    parts = user_messages.str.extract(_SENDER_PATTERN)
+    has_sender = parts[0].notna()
+    users = parts[0].where(has_sender, "group_notification")
+    messages = parts[1].where(has_sender, user_messages)
+    return users, messages
+
+
+def _frame_from_records(
+    dates: List[str], messages: List[str], date_format: Optional[str] = None, swap: bool = True
+) -> pd.DataFrame:
+    """Build the analysis frame from parallel timestamp and raw message lists.
+
+    Only ``date``, ``user`` and ``message`` are built here; analyses compute
+    the calendar columns they need with :func:`derived_column`. The
+    timestamp format that was used is recorded in ``df.attrs["date_format"]``.
+    """
+    with stage("parse_dates", messages=len(dates)):
+        parsed_dates, date_format = _parse_dates(dates, date_format, swap)
+    with stage("senders", messages=len(messages)):
+        df = pd.DataFrame({"date": parsed_dates})
+        df["user"], df["message"] = _split_senders(pd.Series(messages))
+
+    if df.empty:
+        raise ValueError("The uploaded chat file contains no messages.")
+
+    df.attrs["date_format"] = date_format
+    return df
+
+
+def preprocess(data: str, date_format: Optional[str] = None) -> pd.DataFrame:
+    with stage("normalise", chars=len(data)):
+        normalized = _normalise_export_text(data)
+    with stage("split", chars=len(normalized)) as counters:
+        parts = _split_records(normalized)
+        counters.messages = len(parts) // 2
     dates = parts[0::2]
     messages = parts[1::2]
 
     if len(dates) != len(messages):
         raise ValueError("Mismatched timestamps and messages in the chat export.")
 
-    df = pd.DataFrame({"user_message": messages, "date": _parse_dates(dates)})
-
-    users: List[str] = []
-    cleaned_messages: List[str] = []
-    for message in df["user_message"]:
-        entry = re.split(r"([\w\W]+?):\s", message)
-        if entry[1:]:
-            users.append(entry[1])
-            cleaned_messages.append(entry[2])
-        else:
-            users.append("group_notification")
-            cleaned_messages.append(entry[0])
-
-    df["user"] = users
-    df["message"] = cleaned_messages
-    df.drop(columns=["user_message"], inplace=True)
-
-    df["only_date"] = df["date"].dt.date
-    df["year"] = df["date"].dt.year
-    df["month_num"] = df["date"].dt.month
-    df["month"] = df["date"].dt.month_name()
-    df["day"] = df["date"].dt.day
-    df["day_name"] = df["date"].dt.day_name()
-    df["hour"] = df["date"].dt.hour
-    df["minute"] = df["date"].dt.minute
+    return _frame_from_records(dates, messages, date_format)
 
-    if df.empty:
-        raise ValueError("The uploaded chat file contains no messages.")
 
-    return df
\ No newline at end of file
+def starts_new_message(text: str) -> bool:
+    """Whether ``text`` opens with a message timestamp rather than continuing one."""
+    head = _normalise_export_text(text[:200])
+    return _TIME_STAMP_PATTERN.match(head) is not None
+
+
+# ---------------------- PARALLEL ----------------------
+_MIN_SHARD_CHARS = 4 << 20
+_SHARD_SAMPLE_CHARS = 64 * 1024
+
+
+def _shard_bounds(data: str, shards: int) -> List[int]:
+    """Offsets cutting ``data`` into about ``shards`` pieces at message starts.
+
+    Each cut is moved forward to the next line that opens with a timestamp,
+    so no message is split between shards. A cut that finds no such line
+    before the next one is dropped.
+    """
+    step = len(data) // shards
+    bounds = [0]
+    for i in range(1, shards):
+        limit = (i + 1) * step
+        pos = max(i * step, bounds[-1] + 1)
+        while True:
+            pos = data.find("\n", pos - 1, limit) + 1
+            if not pos:
+                break
+            if starts_new_message(data[pos:pos + 200]):
+                bounds.append(pos)
+                break
+            pos += 1
+    bounds.append(len(data))
+    return bounds
+
+
+def _sample_timestamps(shards: Sequence[str]) -> List[str]:
+    """Timestamps from the start of every shard, for one format decision."""
+    per_shard = max(1, _FORMAT_SAMPLE_SIZE // len(shards))
+    sample: List[str] = []
+    for shard in shards:
+        head = _normalise_export_text(shard[:_SHARD_SAMPLE_CHARS])
+        matches = itertools.islice(_TIME_STAMP_PATTERN.finditer(head), per_shard)
+        sample.extend(match.group(1) for match in matches)
+    return sample
+
+
+def _parse_shard(text: str, date_format: str, swap: bool = True) -> pd.DataFrame:
+    """Process-pool worker: the whole of :func:`preprocess` on one shard."""
+    parts = _split_records(_normalise_export_text(text))
+    return _frame_from_records(parts[0::2], parts[1::2], date_format, swap)
+
+
+def preprocess_parallel(
+    data: str,
+    workers: Optional[int] = None,
+    date_format: Optional[str] = None,
+    min_shard_chars: int = _MIN_SHARD_CHARS,
+) -> pd.DataFrame:
+    """:func:`preprocess` spread over a process pool; same frame, same row order.
+
+    The export is cut at message starts into one shard per worker, and each
+    worker normalises, splits and parses its shard. The timestamp format is
+    decided once, from a sample taken across all shards, and handed to every
+    worker. If that sample could not tell DD/MM from MM/DD but some shard
+    could, the shards parsed the other way are parsed again with the order
+    that shard proved, so every row uses one date order. Exports too small
+    to share out, or whose timestamps fit no single explicit format, are
+    parsed by :func:`preprocess` in this process.
+    """
+    workers = workers or os.cpu_count() or 1
+    shards = min(workers, len(data) // min_shard_chars)
+    bounds = _shard_bounds(data, shards) if shards > 1 else [0, len(data)]
+    if len(bounds) < 3:
+        return preprocess(data, date_format)
+
+    texts = [data[start:end] for start, end in zip(bounds, bounds[1:])]
+    if date_format is None:
+        try:
+            date_format = detect_timestamp_format(_sample_timestamps(texts))
+        except ValueError:
+            return preprocess(data)
+
+    with stage("parallel_parse", chars=len(data)) as counters, \
+            ProcessPoolExecutor(max_workers=len(texts)) as pool:
+        frames = list(pool.map(_parse_shard, texts, itertools.repeat(date_format)))
+        used = {frame.attrs["date_format"] for frame in frames}
+        if None in used:
+            # Some shard fit no explicit format; leave the inference to one pass.
+            return preprocess(data)
+        if len(used) > 1:
+            # Only the swapped order can have been proven by a shard.
+            date_format = _swap_date_order(date_format)
+            redo = [i for i, frame in enumerate(frames) if frame.attrs["date_format"] != date_format]
+            reparsed = pool.map(
+                _parse_shard, [texts[i] for i in redo],
+                itertools.repeat(date_format), itertools.repeat(False),
+            )
+            for i, frame in zip(redo, reparsed):
+                frames[i] = frame
+        df = pd.concat(frames, ignore_index=True)
+        counters.messages = len(df)
+
+    df.attrs["date_format"] = date_format
+    return df
+
+
+# ---------------------- DERIVED COLUMNS ----------------------
+_DERIVED_COLUMNS: Dict[str, Callable[[pd.Series], pd.Series]] = {
+    "only_date": lambda dates: dates.dt.date,
+    "year": lambda dates: dates.dt.year,
+    "month_num": lambda dates: dates.dt.month,
+    "month": lambda dates: dates.dt.month_name(),
+    "day": lambda dates: dates.dt.day,
+    "day_name": lambda dates: dates.dt.day_name(),
+    "hour": lambda dates: dates.dt.hour,
+    "minute": lambda dates: dates.dt.minute,
+}
+DERIVED_COLUMNS = tuple(_DERIVED_COLUMNS)
+
+_MONTHS = pd.CategoricalDtype(
+    ["January", "February", "March", "April", "May", "June", "July",
+     "August", "September", "October", "November", "December"],
+    ordered=True,
+)
+_DAY_NAMES = pd.CategoricalDtype(
+    ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"],
+    ordered=True,
+)
+_COMPACT_DTYPES = {
+    "year": "int16", "month_num": "int8", "month": _MONTHS, "day": "int8",
+    "day_name": _DAY_NAMES, "hour": "int8", "minute": "int8",
+}
+
+def _derived_column(dates: pd.Series, column: str, compact: bool) -> pd.Series:
+    if compact and column == "only_date":
+        return dates.dt.normalize()
+    values = _DERIVED_COLUMNS[column](dates)
+    return values.astype(_COMPACT_DTYPES[column]) if compact and column in _COMPACT_DTYPES else values
+
+
+def derived_column(df: pd.DataFrame, column: str) -> pd.Series:
+    """Calendar column ``column`` of ``df``: the stored one, or computed from ``date``.
+
+    Nothing is written to ``df``, so this is safe on frames shared between
+    threads (e.g. the dashboard's cached frame).
+    """
+    if column in df.columns:
+        return df[column]
+    return _derived_column(df["date"], column, df.attrs.get("compact", False)).rename(column)
+
+
+def ensure_derived(df: pd.DataFrame, *columns: str) -> pd.DataFrame:
+    """Add calendar columns computed from ``date`` to ``df`` in place, if missing.
+
+    All of :data:`DERIVED_COLUMNS` are added when none are named. This
+    writes to ``df``, so it is only for frames nobody else reads yet (e.g. a
+    freshly parsed tail before :func:`aggregates.extend_chat` appends it);
+    analyses use :func:`derived_column` instead.
+    """
+    for column in columns or DERIVED_COLUMNS:
+        if column not in df.columns:
+            df[column] = _derived_column(df["date"], column, df.attrs.get("compact", False))
+    return df
+
+
+# ---------------------- COMPACT SCHEMA ----------------------
+def compact_schema(df: pd.DataFrame, arrow_strings: bool = False) -> pd.DataFrame:
+    """Return ``df`` with a memory-lean layout of the same columns.
+
+    ``user`` becomes categorical, ``month``/``day_name`` ordered calendar
+    categoricals, ``only_date`` a ``datetime64`` midnight instead of Python
+    ``date`` objects, and the calendar integers the smallest dtype that fits.
+    With ``arrow_strings`` the message text is stored as ``string[pyarrow]``.
+    Calendar columns derived later follow the same layout, and applying it to
+    an already compact frame is a no-op.
+    """
+    with stage("compact", messages=len(df)):
+        df = df.copy(deep=False)
+        df.attrs["compact"] = True
+        df["user"] = df["user"].astype("category")
+        for column in DERIVED_COLUMNS:
+            if column in df.columns:
+                df[column] = _derived_column(df["date"], column, compact=True)
+        if arrow_strings:
+            df["message"] = df["message"].astype("string[pyarrow]")
+    return df
+
+
+def memory_footprint(df: pd.DataFrame) -> pd.Series:
+    """Bytes held by each column (string contents included), plus a total."""
+    usage = df.memory_usage(deep=True, index=False)
+    usage["total"] = usage.sum()
+    return usage
+
+
+# ---------------------- STREAMING ----------------------
+def _iter_text_chunks(
+    source: ChatSource, encoding: str, chunk_size: int
+) -> Iterator[str]:
+    """Yield decoded text from a file-like object or an iterable of str/bytes."""
+    if hasattr(source, "read"):
+        def pieces() -> Iterator[Union[str, bytes]]:
+            while True:
+                piece = source.read(chunk_size)
+                if not piece:
+                    return
+                yield piece
+        chunks: Iterable[Union[str, bytes]] = pieces()
+    else:
+        chunks = source
+
+    decoder = None
+    for chunk in chunks:
+        if isinstance(chunk, (bytes, bytearray, memoryview)):
+            if decoder is None:
+                decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+            with stage("decode", bytes=len(chunk)):
+                chunk = decoder.decode(chunk)
+        if chunk:
+            yield chunk
+    if decoder is not None:
+        tail = decoder.decode(b"", final=True)
+        if tail:
+            yield tail
+
+
+def _iter_records(text_chunks: Iterable[str]) -> Iterator[Tuple[str, str]]:
+    """Yield (timestamp, raw message) pairs from text arriving in chunks.
+
+    Only complete lines are normalised and scanned, since neither timestamps
+    nor verbose period labels span a line break. A record is emitted once the
+    next timestamp is seen, so multi-line messages split across chunks are
+    stitched back together.
+    """
+    pending = ""           # raw text after the last line break seen
+    buffer = ""            # normalised text from the current record's body onward
+    current_date: Optional[str] = None
+    scan_from = 0
+
+    def drain(text: str) -> Iterator[Tuple[str, str]]:
+        nonlocal buffer, current_date, scan_from
+        with stage("normalise", chars=len(text)):
+            buffer += _normalise_export_text(text)
+        records = []
+        body_start = 0
+        with stage("split", chars=len(buffer) - scan_from) as counters:
+            for match in _TIME_STAMP_PATTERN.finditer(buffer, scan_from):
+                if current_date is not None:
+                    records.append((current_date, buffer[body_start:match.start()]))
+                current_date = match.group(1)
+                body_start = match.end()
+            counters.messages = len(records)
+        yield from records
+        # Text before the first timestamp is export preamble and is dropped.
+        buffer = buffer[body_start:] if current_date is not None else ""
+        scan_from = len(buffer)
+
+    for chunk in text_chunks:
+        pending += chunk
+        cut = pending.rfind("\n") + 1
+        if cut:
+            yield from drain(pending[:cut])
+            pending = pending[cut:]
+
+    yield from drain(pending)
+    if current_date is not None:
+        yield current_date, buffer
+
+
+def iter_preprocess(
+    source: ChatSource,
+    batch_size: int = _STREAM_BATCH_SIZE,
+    chunk_size: int = _STREAM_CHUNK_SIZE,
+    encoding: str = "utf-8",
+    date_format: Optional[str] = None,
+) -> Iterator[pd.DataFrame]:
+    """Parse an export incrementally and yield frames of up to ``batch_size`` rows.
+
+    ``source`` may be a text or binary file object or an iterable of str/bytes
+    chunks; bytes are decoded with ``encoding``. The timestamp format is
+    detected on the first batch unless ``date_format`` is given, and later
+    batches must parse with it exactly so every batch agrees on the date
+    order. A later batch that only parses in the other order (the first
+    batch could not tell MM/DD from DD/MM) raises ``ValueError``; parse such
+    an export whole with :func:`preprocess_stream`.
+    """
+    dates: List[str] = []
+    messages: List[str] = []
+    emitted = False
+    # A given format is pinned from the first batch on; a detected one from the second.
+    swap = date_format is None
+    text_chunks = _iter_text_chunks(source, encoding, chunk_size)
+    for date, message in _iter_records(text_chunks):
+        dates.append(date)
+        messages.append(message)
+        if len(dates) >= batch_size:
+            batch = _batch_frame(dates, messages, date_format, swap)
+            date_format = batch.attrs["date_format"]
+            swap = date_format is None
+            dates, messages = [], []
+            emitted = True
+            yield batch
+
+    if dates:
+        yield _batch_frame(dates, messages, date_format, swap)
+    elif not emitted:
+        raise ValueError(_NO_TIMESTAMPS_MESSAGE)
+
+
+def _batch_frame(
+    dates: List[str], messages: List[str], date_format: Optional[str], swap: bool
+) -> pd.DataFrame:
+    try:
+        return _frame_from_records(dates, messages, date_format, swap)
+    except ValueError as exc:
+        if swap:
+            raise
+        raise ValueError(
+            f"Timestamps later in the chat do not match the date order {date_format!r} "
+            "used for earlier messages."
+        ) from exc
+
+
+def preprocess_stream(
+    source: ChatSource,
+    chunk_size: int = _STREAM_CHUNK_SIZE,
+    encoding: str = "utf-8",
+    date_format: Optional[str] = None,
+) -> pd.DataFrame:
+    """Streaming counterpart of :func:`preprocess` returning the whole frame.
+
+    The export is never held in memory as one string; only the timestamp and
+    message columns are accumulated, and the timestamp format is decided once
+    over all rows exactly like :func:`preprocess`. A given ``date_format``
+    (e.g. inherited from an earlier part of the same chat) must fit every
+    row exactly; otherwise ``ValueError`` is raised.
+    """
+    dates: List[str] = []
+    messages: List[str] = []
+    text_chunks = _iter_text_chunks(source, encoding, chunk_size)
+    for date, message in _iter_records(text_chunks):
+        dates.append(date)
+        messages.append(message)
+
+    if not dates:
+        raise ValueError(_NO_TIMESTAMPS_MESSAGE)
+
+    return _batch_frame(dates, messages, date_format, swap=date_format is None)
@@ -0,0 +1,215 @@
+"""Inverted index over the messages of one parsed chat.
+
+Every message is lowercased and split into word tokens; tokens in the
+Hinglish stopword list are not indexed. Postings are kept in CSR form: the
+sorted vocabulary, an offsets array into one concatenated array of message
+positions, and per-message user codes and timestamps for filtering. A query
+is a few binary searches and sorted-array intersections, so it does not
+scan the message column.
+
+Queries combine, all of which must match:
+
+* keywords: ``meeting tomorrow``
+* phrases: ``"see you tomorrow"`` (checked against the message text)
+* prefixes: ``meet*``
+
+Stopwords in a query only count inside phrases. A query made only of
+stopwords falls back to a substring scan of the filtered messages.
+"""
+import bisect
+import itertools
+import os
+import re
+from functools import reduce
+from typing import Iterable, List, NamedTuple, Optional
+
+import numpy as np
+import pandas as pd
+
+from tokenizer import load_stopwords
+
+_WORD = re.compile(r"\w+")
+_QUERY = re.compile(r'"([^"]*)"|(\S+)')
+
+_INDEX_FILE = "search_index.npz"
+_SEPARATOR = "\x00"
+
+
+class SearchResults(NamedTuple):
+    total: int              # matches after filtering, before ``limit``
+    messages: pd.DataFrame  # date, user, message of the newest matches first
+
+
+class _Query(NamedTuple):
+    terms: List[str]
+    prefixes: List[str]
+    phrases: List[str]
+
+
+def _parse_query(text: str) -> _Query:
+    stop_words = load_stopwords()
+    terms: List[str] = []
+    prefixes: List[str] = []
+    phrases: List[str] = []
+    for phrase, word in _QUERY.findall(text.lower()):
+        if phrase:
+            words = _WORD.findall(phrase)
+            if len(words) > 1:
+                phrases.append(" ".join(words))
+            terms.extend(w for w in words if w not in stop_words)
+        elif word.endswith("*") and _WORD.fullmatch(word[:-1]):
+            prefixes.append(word[:-1])
+        else:
+            terms.extend(w for w in _WORD.findall(word) if w not in stop_words)
+    return _Query(terms, prefixes, phrases)
+
+
+class SearchIndex:
+    def __init__(
+        self,
+        vocabulary: List[str],
+        offsets: np.ndarray,
+        postings: np.ndarray,
+        user_codes: np.ndarray,
+        users: List[str],
+        dates: np.ndarray,
+    ):
+        self.vocabulary = vocabulary    # sorted
+        self.offsets = offsets          # postings of vocabulary[i]: postings[offsets[i]:offsets[i + 1]]
+        self.postings = postings        # message positions, ascending per term
+        self.user_codes = user_codes    # per message, into ``users``
+        self.users = users
+        self.dates = dates              # per message, datetime64[ns]
+
+    @classmethod
+    def build(cls, df: pd.DataFrame) -> "SearchIndex":
+        """Index every message of ``df`` by position."""
+        stop_words = load_stopwords()
+        words = df["message"].astype(str).str.lower().str.findall(_WORD)
+        tokens = pd.Series(list(itertools.chain.from_iterable(words)), dtype=object)
+        positions = np.repeat(np.arange(len(df), dtype=np.int64), words.str.len().to_numpy())
+
+        keep = ~tokens.isin(stop_words).to_numpy()
+        codes, vocabulary = pd.factorize(tokens[keep], sort=True)
+        # One sort of (term, message) keys both groups by term and drops repeats.
+        keys = np.unique(codes.astype(np.int64) * max(len(df), 1) + positions[keep])
+        term, position = np.divmod(keys, max(len(df), 1))
+        offsets = np.searchsorted(term, np.arange(len(vocabulary) + 1))
+
+        user_codes, users = pd.factorize(df["user"].astype(str))
+        return cls(
+            list(vocabulary), offsets.astype(np.int64), position.astype(np.int32),
+            user_codes.astype(np.int32), list(users), df["date"].to_numpy(dtype="datetime64[ns]"),
+        )
+
+    def __len__(self) -> int:
+        return len(self.dates)
+
+    # ---------------------- LOOKUPS ----------------------
+    def _postings(self, term: str) -> np.ndarray:
+        i = bisect.bisect_left(self.vocabulary, term)
+        if i == len(self.vocabulary) or self.vocabulary[i] != term:
+            return self.postings[:0]
+        return self.postings[self.offsets[i]:self.offsets[i + 1]]
+
+    def _prefix_postings(self, prefix: str) -> np.ndarray:
+        lo = bisect.bisect_left(self.vocabulary, prefix)
+        hi = bisect.bisect_left(self.vocabulary, prefix + "\U0010ffff", lo)
+        return np.unique(self.postings[self.offsets[lo]:self.offsets[hi]])
+
+    def _candidates(self, query: _Query) -> Optional[np.ndarray]:
+        """Positions matching every indexed part of the query, or None if nothing is indexed."""
+        lists = [self._postings(term) for term in query.terms]
+        lists += [self._prefix_postings(prefix) for prefix in query.prefixes]
+        if not lists:
+            return None
+        lists.sort(key=len)  # intersect the rarest first
+        return reduce(lambda a, b: np.intersect1d(a, b, assume_unique=True), lists)
+
+    def search(
+        self,
+        df: pd.DataFrame,
+        query: str,
+        users: Optional[Iterable[str]] = None,
+        start: Optional[object] = None,
+        end: Optional[object] = None,
+        limit: Optional[int] = 100,
+    ) -> SearchResults:
+        """Find the messages of ``df`` (the indexed frame) matching ``query``.
+
+        ``users`` and the ``start``/``end`` range of days (both included)
+        narrow the results. The newest ``limit`` matches are returned.
+        """
+        parsed = _parse_query(query)
+        found = self._candidates(parsed)
+        unindexed = found is None
+        if unindexed:
+            found = np.arange(len(self), dtype=np.int32)
+
+        if users is not None:
+            wanted = [self.users.index(user) for user in users if user in self.users]
+            found = found[np.isin(self.user_codes[found], wanted)]
+        if start is not None:
+            found = found[self.dates[found] >= np.datetime64(pd.Timestamp(start).normalize(), "ns")]
+        if end is not None:
+            after = pd.Timestamp(end).normalize() + pd.Timedelta(days=1)
+            found = found[self.dates[found] < np.datetime64(after, "ns")]
+
+        if parsed.phrases or unindexed:
+            texts = df["message"].iloc[found].astype(str)
+            keep = np.ones(len(found), dtype=bool)
+            for phrase in parsed.phrases:
+                keep &= texts.str.contains(_words_pattern(phrase.split()), case=False, regex=True).to_numpy()
+            if unindexed and not parsed.phrases:
+                # Nothing to look up (only stopwords): scan for the words as typed, as whole words.
+                words = _WORD.findall(query.lower())
+                if words:
+                    keep &= texts.str.contains(_words_pattern(words), case=False, regex=True).to_numpy()
+                else:
+                    keep[:] = False
+            found = found[keep]
+
+        newest = found[::-1] if limit is None else found[::-1][:limit]
+        hits = df.iloc[newest][["date", "user", "message"]]
+        return SearchResults(len(found), hits)
+
+    # ---------------------- PERSISTENCE ----------------------
+    def save(self, directory: str) -> str:
+        """Write the index into ``directory``; returns the file path."""
+        path = os.path.join(directory, _INDEX_FILE)
+        staging = os.path.join(directory, f".{_INDEX_FILE}")
+        # Words and user names never contain NUL, so each list is stored as one text blob.
+        with open(staging, "wb") as f:
+            np.savez(
+                f,
+                vocabulary=np.frombuffer(_SEPARATOR.join(self.vocabulary).encode("utf-8"), dtype=np.uint8),
+                users=np.frombuffer(_SEPARATOR.join(self.users).encode("utf-8"), dtype=np.uint8),
+                offsets=self.offsets,
+                postings=self.postings,
+                user_codes=self.user_codes,
+                dates=self.dates.view("int64"),
+            )
+        os.replace(staging, path)
+        return path
+
+    @classmethod
+    def load(cls, directory: str) -> Optional["SearchIndex"]:
+        """Read an index written by :meth:`save`, or None if there is none."""
+        try:
+            with np.load(os.path.join(directory, _INDEX_FILE)) as data:
+                return cls(
+                    _split_blob(data["vocabulary"]), data["offsets"], data["postings"],
+                    data["user_codes"], _split_blob(data["users"]), data["dates"].view("datetime64[ns]"),
+                )
+        except (OSError, KeyError, ValueError):
+            return None
+
+
+def _words_pattern(words: List[str]) -> str:
+    """Regex for ``words`` in order as whole words, like the index tokenizes them."""
+    return r"\b" + r"\W+".join(map(re.escape, words)) + r"\b"
+
+
+def _split_blob(blob: np.ndarray) -> List[str]:
+    text = blob.tobytes().decode("utf-8")
+    return text.split(_SEPARATOR) if text else []
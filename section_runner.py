@@ -0,0 +1,92 @@
+"""Run independent dashboard sections concurrently and time each one.
+
+Sections only read the shared chat frame and its aggregates, so they are
+submitted together to one thread pool and handed back as they finish.
+Threads rather than processes: a process pool would have to pickle the frame
+to every worker and rebuild the shared aggregates in each. The pool size is
+read from ``CHAT_ANALYZER_WORKERS`` (default: up to 4 threads).
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from typing import Callable, Dict, Hashable, Iterator, NamedTuple, Optional, Tuple
+
+WORKERS_ENV = "CHAT_ANALYZER_WORKERS"
+
+_DEFAULT_WORKERS = min(4, os.cpu_count() or 1)
+
+
+class SectionResult(NamedTuple):
+    name: str
+    value: object
+    seconds: float          # time the computation took, even when served from cache
+    cached: bool
+    error: Optional[BaseException]
+
+
+def _timed(job: Callable[[], object]) -> Tuple[object, float]:
+    start = time.perf_counter()
+    value = job()
+    return value, time.perf_counter() - start
+
+
+class SectionRunner:
+    """Thread pool plus a bounded memo of section results.
+
+    Results are memoised per ``(key, section name)``. In-flight computations
+    are shared too, so two sessions opening the same section of the same
+    chat wait on one computation. Failed computations are not kept.
+    """
+
+    def __init__(self, max_workers: int = _DEFAULT_WORKERS, max_results: int = 512):
+        self.max_results = max_results
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="section")
+        self._lock = threading.Lock()
+        self._futures: "OrderedDict[Tuple[Hashable, str], Future]" = OrderedDict()
+
+    @classmethod
+    def from_env(cls) -> "SectionRunner":
+        return cls(max_workers=int(os.environ.get(WORKERS_ENV, _DEFAULT_WORKERS)))
+
+    def _submit(self, memo_key: Tuple[Hashable, str], job: Callable[[], object]) -> Tuple[Future, bool]:
+        """The future for ``memo_key`` and whether it already existed (shared, not run anew)."""
+        future = self._futures.get(memo_key)
+        reused = future is not None and not (future.done() and future.exception() is not None)
+        if not reused:
+            future = self._pool.submit(_timed, job)
+            self._futures[memo_key] = future
+        self._futures.move_to_end(memo_key)
+
+        # Drop the least recently used finished results beyond the bound.
+        for stale in list(self._futures):
+            if len(self._futures) <= self.max_results:
+                break
+            if self._futures[stale].done():
+                del self._futures[stale]
+        return future, reused
+
+    def run(self, key: Hashable, jobs: Dict[str, Callable[[], object]]) -> Iterator[SectionResult]:
+        """Submit every job at once and yield results in completion order.
+
+        ``key`` identifies what the jobs compute on (e.g. chat and user);
+        results already computed for it come back first.
+        """
+        with self._lock:
+            futures = {}
+            reused = set()
+            for name, job in jobs.items():
+                future, shared = self._submit((key, name), job)
+                futures[future] = name
+                if shared:
+                    reused.add(future)
+
+        for future in as_completed(futures):
+            name = futures[future]
+            try:
+                value, seconds = future.result()
+            except Exception as exc:  # reported per section, the others still render
+                yield SectionResult(name, None, 0.0, False, exc)
+                continue
+            yield SectionResult(name, value, seconds, future in reused, None)
@@ -0,0 +1,136 @@
+"""Message timelines whose size does not grow with the length of the chat.
+
+Counts come from the cube's activity facet, bucketed by day, week (Monday
+first) or month in one grouped pass that yields a series for every user at
+once. With ``resolution="auto"`` the finest resolution with at most
+``max_points * _DETAIL_FACTOR`` buckets is used, and any series still longer
+than ``max_points`` is thinned with Largest-Triangle-Three-Buckets (LTTB),
+which keeps the peaks and dips a plot needs. A ten-year chat is charted
+from daily counts in at most ``max_points`` points per user.
+
+    timeline = user_timelines(df, ["Overall", "Alice"])
+    timeline.points   # date, user, message
+"""
+from typing import Iterable, NamedTuple
+
+import numpy as np
+import pandas as pd
+
+from aggregates import cube_for
+
+TIMELINE_MAX_POINTS = 1000
+RESOLUTIONS = ("day", "week", "month")
+
+# Auto resolution accepts this many buckets per output point before going
+# coarser, so LTTB has detail to choose from.
+_DETAIL_FACTOR = 4
+
+
+class Timeline(NamedTuple):
+    resolution: str        # 'day', 'week' or 'month'
+    buckets: int           # calendar buckets spanned, before downsampling
+    points: pd.DataFrame   # date, user, message; at most max_points rows per user
+
+
+def _bucket_starts(days: np.ndarray, resolution: str) -> np.ndarray:
+    """First day of each day's bucket, as ``datetime64[D]``."""
+    if resolution == "day":
+        return days
+    if resolution == "week":
+        # 1970-01-01 was a Thursday; shift so weeks start on Monday.
+        return ((days.astype(np.int64) + 3) // 7 * 7 - 3).astype("datetime64[D]")
+    return days.astype("datetime64[M]").astype("datetime64[D]")
+
+
+def _calendar(first: np.datetime64, last: np.datetime64, resolution: str) -> pd.DatetimeIndex:
+    freq = {"day": "D", "week": "W-MON", "month": "MS"}[resolution]
+    return pd.date_range(first, last, freq=freq, name="date")
+
+
+def _choose_resolution(first: pd.Timestamp, last: pd.Timestamp, max_points: int) -> str:
+    span_days = (last - first).days + 1
+    spans = {"day": span_days, "week": span_days // 7 + 1, "month": span_days // 28 + 1}
+    for resolution in RESOLUTIONS:
+        if spans[resolution] <= max_points * _DETAIL_FACTOR:
+            return resolution
+    return "month"
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    """Positions of the ``n_out`` points LTTB keeps from the series (x ascending).
+
+    The first and last points are always kept; every bucket in between
+    keeps the point forming the largest triangle with the previously kept
+    point and the mean of the next bucket.
+    """
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    x = x.astype(np.float64)
+    y = y.astype(np.float64)
+    edges = (np.arange(n_out - 1) * (n - 2) / (n_out - 2)).astype(np.int64) + 1
+    edges[-1] = n - 1
+
+    kept = np.empty(n_out, dtype=np.int64)
+    kept[0], kept[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+        following = slice(end, edges[i + 2]) if i + 2 < len(edges) else slice(n - 1, n)
+        mean_x, mean_y = x[following].mean(), y[following].mean()
+        area = np.abs(
+            (x[a] - mean_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (mean_y - y[a])
+        )
+        a = start + int(area.argmax())
+        kept[i + 1] = a
+    return kept
+
+
+def user_timelines(
+    df: pd.DataFrame,
+    users: Iterable[str],
+    resolution: str = "auto",
+    max_points: int = TIMELINE_MAX_POINTS,
+) -> Timeline:
+    """Messages per bucket for each of ``users`` ('Overall' for everyone).
+
+    Buckets without messages count as zero. Each user's series is
+    downsampled to at most ``max_points`` points.
+    """
+    if resolution != "auto" and resolution not in RESOLUTIONS:
+        raise ValueError(f"Unknown resolution {resolution!r}; expected 'auto' or one of {RESOLUTIONS}.")
+    users = list(users)
+    activity = cube_for(df).activity
+    columns = ["date", "user", "message"]
+    if activity.empty or not users:
+        return Timeline(resolution if resolution != "auto" else "day", 0, pd.DataFrame(columns=columns))
+
+    days = pd.to_datetime(activity["only_date"]).to_numpy().astype("datetime64[D]")
+    first, last = days.min(), days.max()
+    if resolution == "auto":
+        resolution = _choose_resolution(pd.Timestamp(first), pd.Timestamp(last), max_points)
+
+    # One binned pass over the facet: a bucket x user matrix covering every user.
+    calendar = _calendar(_bucket_starts(first, resolution), last, resolution)
+    buckets = np.searchsorted(calendar.to_numpy().astype("datetime64[D]"), _bucket_starts(days, resolution))
+    user_codes, names = pd.factorize(activity["user"].astype(str))
+    flat = np.ravel_multi_index((buckets, user_codes), (len(calendar), len(names)))
+    matrix = np.bincount(
+        flat, weights=activity["messages"].to_numpy(), minlength=len(calendar) * len(names)
+    ).astype(np.int64).reshape(len(calendar), len(names))
+    columns_of = {name: i for i, name in enumerate(names)}
+
+    x = calendar.asi8
+    frames = []
+    for user in users:
+        if user == "Overall":
+            counts = matrix.sum(axis=1)
+        elif user in columns_of:
+            counts = matrix[:, columns_of[user]]
+        else:
+            continue
+        kept = lttb_indices(x, counts, max_points)
+        frames.append(pd.DataFrame({"date": calendar[kept], "user": user, "message": counts[kept]}))
+
+    points = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=columns)
+    return Timeline(resolution, len(calendar), points)
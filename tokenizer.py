@@ -0,0 +1,83 @@
+import functools
+import itertools
+import os
+from collections import Counter
+from typing import TYPE_CHECKING, FrozenSet, Hashable, List, Tuple
+
+import pandas as pd
+
+from emoji_matcher import extract_emojis
+
+if TYPE_CHECKING:
+    from urlextract import URLExtract
+
+_STOPWORDS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "stop_hinglish.txt")
+
+
+@functools.lru_cache(maxsize=None)
+def load_stopwords() -> FrozenSet[str]:
+    """Load the Hinglish stopword list shipped next to this module."""
+    with open(_STOPWORDS_PATH, "r", encoding="utf-8") as f:
+        return frozenset(f.read().split())
+
+
+@functools.lru_cache(maxsize=None)
+def _url_extractor() -> "URLExtract":
+    """One shared extractor, imported and built on first use (it loads the TLD list)."""
+    from urlextract import URLExtract
+
+    return URLExtract()
+
+
+def tokenize_messages(messages: pd.Series, stop_words: FrozenSet[str]) -> pd.DataFrame:
+    """Scan every message once and record what the text analytics need.
+
+    Returns a frame aligned with ``messages`` holding the whitespace token
+    count (``n_words``), the lowercase tokens left after stopword filtering
+    (``tokens``), the number of URLs (``n_urls``) and the emojis in order of
+    appearance (``emojis``, whole multi-codepoint sequences).
+    """
+    extractor = _url_extractor()
+
+    n_words: List[int] = []
+    tokens: List[List[str]] = []
+    n_urls: List[int] = []
+    for text in messages.astype(str):
+        lowered = text.lower().split()
+        n_words.append(len(lowered))
+        tokens.append([word for word in lowered if word not in stop_words])
+        # Every URL URLExtract recognises needs a dot before its TLD.
+        n_urls.append(len(extractor.find_urls(text)) if "." in text else 0)
+
+    return pd.DataFrame(
+        {
+            "n_words": n_words,
+            "tokens": tokens,
+            "n_urls": n_urls,
+            "emojis": extract_emojis(messages).tolist(),
+        },
+        index=messages.index,
+    )
+
+
+def count_tokens(token_lists: pd.Series, groups: pd.Series, names: Tuple[str, str]) -> pd.Series:
+    """Count tokens per group over already-tokenized messages.
+
+    Each group's token lists are chained straight into one ``Counter`` (a
+    single C-level pass), so no Series with a row per token is built.
+    Returns the counts indexed by ``(group, token)`` with the levels called
+    ``names``, sorted like a groupby result.
+    """
+    keys: List[Hashable] = []
+    words: List[str] = []
+    counts: List[int] = []
+    for group, lists in token_lists.groupby(groups, observed=True, sort=False):
+        counter = Counter(itertools.chain.from_iterable(lists))
+        keys.extend([group] * len(counter))
+        words.extend(counter.keys())
+        counts.extend(counter.values())
+
+    # Keep the group dtype (e.g. a categorical user column) on the index level.
+    levels = [pd.array(keys, dtype=groups.dtype), words]
+    index = pd.MultiIndex.from_arrays(levels, names=list(names))
+    return pd.Series(counts, index=index, dtype="int64").sort_index()
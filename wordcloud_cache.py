@@ -0,0 +1,81 @@
+"""Render word clouds to PNG once and keep the bytes in a size-bounded LRU.
+
+Clouds are laid out from the precomputed word frequencies of a chat and
+encoded straight to PNG, so serving one needs neither the message text nor
+a matplotlib figure. Entries are keyed by chat, user and rendering options;
+the least recently served are dropped once the cached bytes exceed the
+budget, read from ``CHAT_ANALYZER_WORDCLOUD_CACHE_MB`` (default 64 MB).
+"""
+import io
+import os
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable, Tuple
+
+import pandas as pd
+
+import charts
+
+CACHE_MB_ENV = "CHAT_ANALYZER_WORDCLOUD_CACHE_MB"
+
+_DEFAULT_MAX_MB = 64
+
+
+class WordcloudCache:
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._images: "OrderedDict[Tuple[Hashable, ...], bytes]" = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def from_env(cls) -> "WordcloudCache":
+        max_mb = float(os.environ.get(CACHE_MB_ENV, _DEFAULT_MAX_MB))
+        return cls(int(max_mb * 1024 * 1024))
+
+    def png(
+        self,
+        chat: Hashable,
+        user: str,
+        frequencies: Callable[[], pd.Series],
+        **options: object,
+    ) -> bytes:
+        """PNG of the cloud for ``user`` in ``chat``, rendered on first request.
+
+        ``frequencies`` is only called on a miss. ``options`` are passed to
+        :func:`charts.wordcloud` (size, background) and are part of the key.
+        """
+        key = (chat, user, *sorted(options.items()))
+        with self._lock:
+            image = self._images.get(key)
+            if image is not None:
+                self._images.move_to_end(key)
+                self.hits += 1
+                return image
+            self.misses += 1
+
+        # Rendered outside the lock; a concurrent miss on the same key just renders twice.
+        buffer = io.BytesIO()
+        charts.wordcloud(frequencies(), **options).to_image().save(buffer, format="PNG")
+        image = buffer.getvalue()
+        self._put(key, image)
+        return image
+
+    def _put(self, key: Tuple[Hashable, ...], image: bytes) -> None:
+        if len(image) > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._images.pop(key, None)
+            if previous is not None:
+                self._bytes -= len(previous)
+            self._images[key] = image
+            self._bytes += len(image)
+            while self._bytes > self.max_bytes:
+                _, dropped = self._images.popitem(last=False)
+                self._bytes -= len(dropped)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"images": len(self._images), "bytes": self._bytes, "hits": self.hits, "misses": self.misses}